@@ -0,0 +1,33 @@
+"""Add composite index for conversation history queries
+
+Revision ID: 8c2f1b7ad3e9
+Revises: 4daa3af66f95
+Create Date: 2025-11-28 10:14:02.318764
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2f1b7ad3e9'
+down_revision: Union[str, None] = '4daa3af66f95'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Composite index so the "last N messages of a conversation" queries
+    # become an index scan instead of a sort over the whole partition
+    op.create_index(
+        'ix_messages_conv_created',
+        'messages',
+        ['conversation_id', sa.text('created_at DESC'), 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_messages_conv_created', table_name='messages')
@@ -0,0 +1,40 @@
+"""Convert message_metadata to JSONB
+
+Revision ID: b91d4e05c27a
+Revises: 8c2f1b7ad3e9
+Create Date: 2025-11-28 11:42:55.104219
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b91d4e05c27a'
+down_revision: Union[str, None] = '8c2f1b7ad3e9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # JSONB stores a parsed binary form, so large metadata blobs
+    # (reasoning_steps, tool_calls, search results) are not re-parsed
+    # from text on every read and can be indexed if we ever filter by key
+    op.alter_column(
+        'messages',
+        'message_metadata',
+        type_=postgresql.JSONB(astext_type=sa.Text()),
+        postgresql_using='message_metadata::jsonb'
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        'messages',
+        'message_metadata',
+        type_=sa.JSON(),
+        postgresql_using='message_metadata::json'
+    )
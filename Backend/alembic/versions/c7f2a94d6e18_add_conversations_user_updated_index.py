@@ -0,0 +1,33 @@
+"""Add composite index for the conversation list query
+
+Revision ID: c7f2a94d6e18
+Revises: e4a7c9f81b56
+Create Date: 2025-12-03 09:21:47.905112
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7f2a94d6e18'
+down_revision: Union[str, None] = 'e4a7c9f81b56'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Conversation list is WHERE user_id = ? ORDER BY updated_at DESC; the
+    # composite index turns the filter+sort into an ordered index scan
+    op.create_index(
+        'ix_conversations_user_updated',
+        'conversations',
+        ['user_id', sa.text('updated_at DESC')],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_conversations_user_updated', table_name='conversations')
@@ -0,0 +1,30 @@
+"""Drop unused Langfuse id indexes
+
+Revision ID: e4a7c9f81b56
+Revises: b91d4e05c27a
+Create Date: 2025-11-28 12:05:41.887310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a7c9f81b56'
+down_revision: Union[str, None] = 'b91d4e05c27a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Nothing queries by these columns — they are only written — so the
+    # indexes just add btree maintenance to every message/conversation insert
+    op.drop_index('ix_messages_langfuse_trace_id', table_name='messages')
+    op.drop_index('ix_conversations_langfuse_session_id', table_name='conversations')
+
+
+def downgrade() -> None:
+    op.create_index('ix_conversations_langfuse_session_id', 'conversations', ['langfuse_session_id'], unique=False)
+    op.create_index('ix_messages_langfuse_trace_id', 'messages', ['langfuse_trace_id'], unique=False)
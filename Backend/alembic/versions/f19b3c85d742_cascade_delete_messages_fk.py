@@ -0,0 +1,43 @@
+"""Cascade message deletion at the FK level
+
+Revision ID: f19b3c85d742
+Revises: c7f2a94d6e18
+Create Date: 2025-12-03 11:42:09.137258
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f19b3c85d742'
+down_revision: Union[str, None] = 'c7f2a94d6e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Let the database cascade message deletion so dropping a conversation
+    # is one DELETE statement instead of an ORM-driven pair
+    op.drop_constraint('messages_conversation_id_fkey', 'messages', type_='foreignkey')
+    op.create_foreign_key(
+        'messages_conversation_id_fkey',
+        'messages',
+        'conversations',
+        ['conversation_id'],
+        ['id'],
+        ondelete='CASCADE'
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint('messages_conversation_id_fkey', 'messages', type_='foreignkey')
+    op.create_foreign_key(
+        'messages_conversation_id_fkey',
+        'messages',
+        'conversations',
+        ['conversation_id'],
+        ['id']
+    )
@@ -1,12 +1,18 @@
+from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from app.config import settings
 from app.database import get_db
 from app.schemas.user import UserCreate, UserLogin, User, Token
 from app.services.auth_service import AuthService
 from app.middleware.auth_middleware import get_current_active_user
+from app.utils.security import create_access_token
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
+# Token lifetime is fixed per-process; build the timedelta once
+ACCESS_TOKEN_EXPIRES = timedelta(minutes=settings.access_token_expire_minutes)
+
 
 @router.post("/register", response_model=User, status_code=status.HTTP_201_CREATED)
 def register(user: UserCreate, db: Session = Depends(get_db)):
@@ -35,13 +41,8 @@ def read_users_me(current_user: User = Depends(get_current_active_user)):
 @router.post("/refresh")
 def refresh_token(current_user: User = Depends(get_current_active_user)):
     """Refresh the access token."""
-    from app.utils.security import create_access_token
-    from datetime import timedelta
-    from app.config import settings
-    
-    access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
-        data={"sub": current_user.email}, expires_delta=access_token_expires
+        data={"sub": current_user.email}, expires_delta=ACCESS_TOKEN_EXPIRES
     )
     
     return {
@@ -1,38 +1,212 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Dict, Any
-from app.database import get_db
+from app.database import get_async_db, AsyncSessionLocal
 from app.middleware.auth_middleware import get_current_active_user
 from app.models.user import User
 from app.models.conversation import Conversation
 from app.models.message import Message
 from app.schemas.chat import ChatRequest, ChatResponse, RegenerateRequest, Message as MessageSchema
+from app.api.conversations import invalidate_list_cache
 from app.services.ollama_service import ollama_service
 from app.services.search_service import search_service
 from app.services.langfuse_service import langfuse_service
 from app.services.llamaindex_service import llamaindex_service
 from app.config import settings
+from typing import Optional, Tuple
+import asyncio
+import json
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+# Static tool options appended to the Ollama model list
+_TOOL_OPTIONS = [
+    {
+        "name": "auto",
+        "size": 0,
+        "modified_at": "",
+        "type": "tool",
+        "description": "AI automatically decides when to use internet search"
+    },
+    {
+        "name": "internet",
+        "size": 0,
+        "modified_at": "",
+        "type": "tool",
+        "description": "Direct internet search"
+    }
+]
+
+# The model catalog changes on the order of minutes, not requests, so cache
+# the built /models response briefly instead of hitting Ollama on every poll
+_MODELS_CACHE_TTL = 60.0
+_models_cache: Optional[Tuple[float, Dict[str, Any]]] = None
+_models_lock = asyncio.Lock()
+
+
+def _chat_response(
+    background_tasks: BackgroundTasks,
+    message_schema: MessageSchema,
+    conversation_id: int,
+    trace_id: Optional[str]
+) -> ChatResponse:
+    """Finalize the Langfuse trace off the hot path and build the response."""
+    background_tasks.add_task(
+        langfuse_service.finalize_trace, trace_id, message_schema.content
+    )
+    return ChatResponse.model_construct(
+        message=message_schema,
+        conversation_id=conversation_id,
+        langfuse_trace_id=trace_id
+    )
+
+
+async def _ensure_langfuse_session(
+    db: AsyncSession,
+    conversation: Conversation,
+    user_id: int
+) -> None:
+    """Create and persist the conversation's Langfuse session id if missing.
+
+    The UPDATE is conditional on the column still being NULL, so two
+    concurrent first messages cannot both persist a session id and burn
+    Langfuse quota; the loser adopts whatever the winner wrote.
+    """
+    if conversation.langfuse_session_id:
+        return
+
+    session_id = langfuse_service.create_session(user_id, conversation.id)
+    if not session_id:
+        return
+
+    result = await db.execute(
+        update(Conversation).where(
+            Conversation.id == conversation.id,
+            Conversation.langfuse_session_id.is_(None)
+        ).values(langfuse_session_id=session_id)
+    )
+    if not result.rowcount:
+        # Lost the race: read back the session id the other request stored
+        session_id = (await db.execute(
+            select(Conversation.langfuse_session_id).where(
+                Conversation.id == conversation.id
+            )
+        )).scalar_one()
+
+    # Sync the in-memory object without marking the attribute dirty; the
+    # value is already persisted by the UPDATE above
+    set_committed_value(conversation, "langfuse_session_id", session_id)
+
+
+async def _insert_assistant_message(
+    db: AsyncSession,
+    conversation_id: int,
+    content: str,
+    tool_used: Optional[str],
+    trace_id: Optional[str],
+    message_metadata: Dict[str, Any]
+) -> MessageSchema:
+    """Insert an assistant message with a Core statement and build its schema.
+
+    A single INSERT .. RETURNING obtains the generated id and created_at
+    without Unit-of-Work bookkeeping or a post-commit refresh SELECT, and
+    model_construct skips revalidating values we just wrote ourselves.
+    """
+    result = await db.execute(
+        insert(Message).values(
+            conversation_id=conversation_id,
+            role="assistant",
+            content=content,
+            tool_used=tool_used,
+            langfuse_trace_id=trace_id,
+            message_metadata=message_metadata
+        ).returning(Message.id, Message.created_at)
+    )
+    message_id, created_at = result.one()
+    await db.commit()
+    # The handlers do no further DB work after this write, so hand the
+    # connection back to the pool before schema construction and response
+    # serialization instead of holding it until dependency teardown
+    await db.close()
+
+    return MessageSchema.model_construct(
+        id=message_id,
+        conversation_id=conversation_id,
+        role="assistant",
+        content=content,
+        tool_used=tool_used,
+        langfuse_trace_id=trace_id,
+        message_metadata=message_metadata,
+        created_at=created_at
+    )
+
+
+_HISTORY_TAIL = 10
+_HISTORY_HEAD = 2
+
+
+async def _fetch_history(db: AsyncSession, conversation_id: int, before_id: int) -> List[Dict[str, str]]:
+    """Fetch the LLM history window: the opening exchange plus recent turns.
+
+    Only role/content are projected, ordered by id to ride the composite
+    index. When the tail window is full the conversation's first messages
+    are fetched too, so format_conversation_history can pin a byte-stable
+    prompt prefix across turns — a pure last-N window would shift the whole
+    prompt every call and defeat the server-side prompt cache.
+    """
+    result = await db.execute(
+        select(Message.id, Message.role, Message.content).where(
+            Message.conversation_id == conversation_id,
+            Message.id < before_id
+        ).order_by(Message.id.desc()).limit(_HISTORY_TAIL)
+    )
+    tail_rows = list(reversed(result.all()))
+
+    head_rows = []
+    if len(tail_rows) == _HISTORY_TAIL:
+        # The window may not reach the conversation start; fetch the true
+        # first exchange and drop any overlap with the tail
+        result = await db.execute(
+            select(Message.id, Message.role, Message.content).where(
+                Message.conversation_id == conversation_id,
+                Message.id < before_id
+            ).order_by(Message.id.asc()).limit(_HISTORY_HEAD)
+        )
+        tail_ids = {row.id for row in tail_rows}
+        head_rows = [row for row in result.all() if row.id not in tail_ids]
+
+    return [
+        {"role": role, "content": content}
+        for _, role, content in head_rows + tail_rows
+    ]
+
 
 @router.post("/send", response_model=ChatResponse)
 async def send_message(
     chat_request: ChatRequest,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Send a message and get AI response."""
+    msg = chat_request.message
     try:
         # Get or create conversation
         if chat_request.conversation_id:
-            conversation = db.query(Conversation).filter(
-                Conversation.id == chat_request.conversation_id,
-                Conversation.user_id == current_user.id
-            ).first()
+            result = await db.execute(
+                select(Conversation).where(
+                    Conversation.id == chat_request.conversation_id,
+                    Conversation.user_id == current_user.id
+                )
+            )
+            conversation = result.scalar_one_or_none()
             if not conversation:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -42,29 +216,34 @@ async def send_message(
             # Create new conversation
             conversation = Conversation(
                 user_id=current_user.id,
-                title=chat_request.message[:50] + "..." if len(chat_request.message) > 50 else chat_request.message
+                title=msg if len(msg) <= 50 else msg[:50] + "..."
             )
             db.add(conversation)
-            db.commit()
-            db.refresh(conversation)
-        
-        # Create Langfuse session if not exists
-        if not conversation.langfuse_session_id:
-            session_id = langfuse_service.create_session(current_user.id, conversation.id)
-            if session_id:
-                conversation.langfuse_session_id = session_id
-                db.commit()
-
-        # Save user message
+            await db.flush()  # populate conversation.id without committing yet
+
+        # Create Langfuse session if not exists (race-safe conditional update)
+        await _ensure_langfuse_session(db, conversation, current_user.id)
+
+        # Save user message; one commit persists the conversation, its
+        # Langfuse session id and the user turn in a single transaction
         user_message = Message(
             conversation_id=conversation.id,
             role="user",
-            content=chat_request.message,
+            content=msg,
             tool_used=chat_request.tool_selection
         )
         db.add(user_message)
-        db.commit()
-        db.refresh(user_message)
+        await db.commit()
+
+        # Sending can create a conversation or reorder the sidebar; don't
+        # let the cached first page survive the write
+        invalidate_list_cache(current_user.id)
+
+        if chat_request.model != "auto":
+            # This turn won't go through the agent, so the cached agent
+            # memory falls behind the stored history; drop it and let the
+            # next auto turn rebuild from the database
+            llamaindex_service.discard_memory(conversation.id)
 
         # Create Langfuse trace
         # Use proper model name for Langfuse, not tool names
@@ -74,24 +253,13 @@ async def send_message(
         
         trace_id = langfuse_service.create_trace(
             session_id=conversation.langfuse_session_id,
-            user_message=chat_request.message,
+            user_message=msg,
             model=trace_model,
             tool_used=chat_request.tool_selection
         )
 
-        # Get conversation history (last 10 messages)
-        history_messages = db.query(Message).filter(
-            Message.conversation_id == conversation.id,
-            Message.id < user_message.id  # Exclude the current user message
-        ).order_by(Message.created_at.desc()).limit(10).all()
-        
-        # Format conversation history
-        conversation_history = []
-        for msg in reversed(history_messages):  # Reverse to get chronological order
-            conversation_history.append({
-                "role": msg.role,
-                "content": msg.content
-            })
+        # Get conversation history, excluding the current user message
+        conversation_history = await _fetch_history(db, conversation.id, user_message.id)
 
         # Handle auto mode - let LlamaIndex agent decide whether to use tools
         if chat_request.model == "auto":
@@ -102,63 +270,60 @@ async def send_message(
                     model_name = settings.ollama_default_model  # Use default Ollama model
                 
                 ai_response = await llamaindex_service.generate_auto_response(
-                    prompt=chat_request.message,
+                    prompt=msg,
                     conversation_history=conversation_history,
-                    model=model_name
+                    model=model_name,
+                    conversation_id=conversation.id
                 )
 
+                # Hoist the repeated ai_response lookups into locals so the
+                # logging payload and metadata reuse the same objects
+                get = ai_response.get
+                used_search = get("used_search", False)
+                agent_type = get("agent_type", "react")
+                fallback = get("fallback", False)
+                tool_calls = get("tool_calls", [])
+                reasoning_steps = get("reasoning_steps", [])
+
                 # Log agent reasoning in Langfuse
-                langfuse_service.log_agent_reasoning(
+                background_tasks.add_task(
+                    langfuse_service.log_agent_reasoning,
                     trace_id=trace_id,
-                    reasoning_steps=ai_response.get("reasoning_steps", []),
-                    tool_calls=ai_response.get("tool_calls", []),
+                    reasoning_steps=reasoning_steps,
+                    tool_calls=tool_calls,
                     agent_decision={
-                        "used_search": ai_response.get("used_search", False),
-                        "agent_type": ai_response.get("agent_type", "react"),
-                        "fallback": ai_response.get("fallback", False)
+                        "used_search": used_search,
+                        "agent_type": agent_type,
+                        "fallback": fallback
                     }
                 )
 
                 # Log individual tool calls if any
-                for tool_call in ai_response.get("tool_calls", []):
-                    langfuse_service.log_tool_call(
-                        trace_id=trace_id,
-                        tool_name=tool_call.get("tool_name", "unknown"),
-                        tool_input=tool_call.get("input", {}),
-                        tool_output=tool_call.get("output", {})
-                    )
+                background_tasks.add_task(
+                    langfuse_service.log_tool_calls_batch, trace_id, tool_calls
+                )
 
                 # Save assistant message
-                assistant_message = Message(
+                assistant_schema = await _insert_assistant_message(
+                    db,
                     conversation_id=conversation.id,
-                    role="assistant",
                     content=ai_response["content"],
                     tool_used=chat_request.tool_selection,
-                    langfuse_trace_id=trace_id,
+                    trace_id=trace_id,
                     message_metadata={
                         "model": ai_response["model"],
-                        "agent_type": ai_response.get("agent_type", "react"),
-                        "used_search": ai_response.get("used_search", False),
-                        "tool_calls": ai_response.get("tool_calls", []),
-                        "reasoning_steps": ai_response.get("reasoning_steps", []),
-                        "fallback": ai_response.get("fallback", False)
+                        "agent_type": agent_type,
+                        "used_search": used_search,
+                        "tool_calls": tool_calls,
+                        "reasoning_steps": reasoning_steps,
+                        "fallback": fallback
                     }
                 )
-                db.add(assistant_message)
-                db.commit()
-                db.refresh(assistant_message)
 
-                # Finalize Langfuse trace
-                langfuse_service.finalize_trace(trace_id, ai_response["content"])
-
-                return ChatResponse(
-                    message=MessageSchema.from_orm(assistant_message),
-                    conversation_id=conversation.id,
-                    langfuse_trace_id=trace_id
-                )
+                return _chat_response(background_tasks, assistant_schema, conversation.id, trace_id)
 
             except Exception as e:
-                logger.error(f"Auto mode failed: {e}")
+                logger.error("Auto mode failed: %s", e)
                 langfuse_service.log_error(trace_id, str(e), "auto_mode_error")
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -168,40 +333,32 @@ async def send_message(
         # Handle internet search if requested - return search results directly without Ollama
         elif chat_request.tool_selection == "internet":
             try:
-                search_results = await search_service.search(chat_request.message)
+                search_results = await search_service.search(msg)
                 search_context = search_service.format_search_results_for_llm(search_results)
                 search_metadata = search_results
                     
                 # Log search span in Langfuse
-                langfuse_service.log_search_span(trace_id, chat_request.message, search_results)
+                background_tasks.add_task(
+                    langfuse_service.log_search_span, trace_id, msg, search_results
+                )
                 
                 # Return search results directly without calling Ollama
-                assistant_message = Message(
+                assistant_schema = await _insert_assistant_message(
+                    db,
                     conversation_id=conversation.id,
-                    role="assistant",
                     content=search_context,
                     tool_used=chat_request.tool_selection,
-                    langfuse_trace_id=trace_id,
+                    trace_id=trace_id,
                     message_metadata={
                         "search_results": search_metadata,
                         "source": "internet_search"
                     }
                 )
-                db.add(assistant_message)
-                db.commit()
-                db.refresh(assistant_message)
 
-                # Finalize Langfuse trace
-                langfuse_service.finalize_trace(trace_id, search_context)
-
-                return ChatResponse(
-                    message=MessageSchema.from_orm(assistant_message),
-                    conversation_id=conversation.id,
-                    langfuse_trace_id=trace_id
-                )
+                return _chat_response(background_tasks, assistant_schema, conversation.id, trace_id)
 
             except Exception as e:
-                logger.error(f"Search failed: {e}")
+                logger.error("Search failed: %s", e)
                 langfuse_service.log_error(trace_id, str(e), "search_error")
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -210,7 +367,7 @@ async def send_message(
 
         # Handle "none" tool selection - Generate AI response using Ollama directly
         else:  # This covers tool_selection == "none" and any other values
-            prompt = chat_request.message
+            prompt = msg
             try:
                 ai_response = await ollama_service.generate_response(
                     prompt=prompt,
@@ -221,7 +378,8 @@ async def send_message(
 
                 # Log LLM generation in Langfuse
                 input_messages = conversation_history + [{"role": "user", "content": prompt}]
-                langfuse_service.log_llm_generation(
+                background_tasks.add_task(
+                    langfuse_service.log_llm_generation,
                     trace_id=trace_id,
                     model=ai_response["model"],
                     input_messages=input_messages,
@@ -230,12 +388,12 @@ async def send_message(
                 )
 
                 # Save assistant message
-                assistant_message = Message(
+                assistant_schema = await _insert_assistant_message(
+                    db,
                     conversation_id=conversation.id,
-                    role="assistant",
                     content=ai_response["content"],
                     tool_used=chat_request.tool_selection,
-                    langfuse_trace_id=trace_id,
+                    trace_id=trace_id,
                     message_metadata={
                         "model": ai_response["model"],
                         "usage": {
@@ -246,21 +404,11 @@ async def send_message(
                         }
                     }
                 )
-                db.add(assistant_message)
-                db.commit()
-                db.refresh(assistant_message)
 
-                # Finalize Langfuse trace
-                langfuse_service.finalize_trace(trace_id, ai_response["content"])
-
-                return ChatResponse(
-                    message=MessageSchema.from_orm(assistant_message),
-                    conversation_id=conversation.id,
-                    langfuse_trace_id=trace_id
-                )
+                return _chat_response(background_tasks, assistant_schema, conversation.id, trace_id)
 
             except Exception as e:
-                logger.error(f"AI response generation failed: {e}")
+                logger.error("AI response generation failed: %s", e)
                 langfuse_service.log_error(trace_id, str(e), "llm_generation_error")
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -270,7 +418,134 @@ async def send_message(
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Chat endpoint error: {e}")
+        logger.error("Chat endpoint error: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Internal server error"
+        )
+
+
+@router.post("/stream")
+async def stream_message(
+    chat_request: ChatRequest,
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Send a message and stream the AI response via server-sent events.
+
+    Streams the direct Ollama path token-by-token so the client sees the
+    first token instead of waiting for the full generation; the assembled
+    assistant message is persisted once the stream completes.
+    """
+    msg = chat_request.message
+    try:
+        # Get or create conversation
+        if chat_request.conversation_id:
+            result = await db.execute(
+                select(Conversation).where(
+                    Conversation.id == chat_request.conversation_id,
+                    Conversation.user_id == current_user.id
+                )
+            )
+            conversation = result.scalar_one_or_none()
+            if not conversation:
+                raise HTTPException(
+                    status_code=status.HTTP_404_NOT_FOUND,
+                    detail="Conversation not found"
+                )
+        else:
+            conversation = Conversation(
+                user_id=current_user.id,
+                title=msg if len(msg) <= 50 else msg[:50] + "..."
+            )
+            db.add(conversation)
+            await db.flush()
+
+        await _ensure_langfuse_session(db, conversation, current_user.id)
+
+        # Persist the user turn before streaming starts
+        user_message = Message(
+            conversation_id=conversation.id,
+            role="user",
+            content=msg,
+            tool_used=chat_request.tool_selection
+        )
+        db.add(user_message)
+        await db.commit()
+
+        # Same as /send: the write may have created or reordered a
+        # conversation, so the cached list page is stale
+        invalidate_list_cache(current_user.id)
+
+        # Streamed turns never touch the agent; keep its cached memory
+        # from drifting behind the stored history
+        llamaindex_service.discard_memory(conversation.id)
+
+        trace_model = chat_request.model or settings.ollama_default_model
+        if trace_model in ["auto", "internet"]:
+            trace_model = settings.ollama_default_model
+
+        trace_id = langfuse_service.create_trace(
+            session_id=conversation.langfuse_session_id,
+            user_message=msg,
+            model=trace_model,
+            tool_used=chat_request.tool_selection
+        )
+
+        conversation_history = await _fetch_history(db, conversation.id, user_message.id)
+
+        conversation_id = conversation.id
+        tool_used = chat_request.tool_selection
+
+        async def event_stream():
+            chunks = []
+            try:
+                async for delta in ollama_service.stream_response(
+                    prompt=msg,
+                    conversation_history=conversation_history,
+                    model=chat_request.model,
+                    system_message="You are a helpful AI assistant. Provide accurate and helpful responses."
+                ):
+                    chunks.append(delta)
+                    yield f"data: {json.dumps({'delta': delta})}\n\n"
+            except Exception as e:
+                logger.error("Streaming generation failed: %s", e)
+                langfuse_service.log_error(trace_id, str(e), "llm_stream_error")
+                yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                return
+
+            content = "".join(chunks)
+
+            # Persist the assembled assistant message with a fresh session;
+            # the request-scoped one may already be released by now
+            async with AsyncSessionLocal() as session:
+                assistant_message = Message(
+                    conversation_id=conversation_id,
+                    role="assistant",
+                    content=content,
+                    tool_used=tool_used,
+                    langfuse_trace_id=trace_id,
+                    message_metadata={"model": trace_model, "streamed": True}
+                )
+                session.add(assistant_message)
+                await session.commit()
+                message_id = assistant_message.id
+
+            langfuse_service.finalize_trace(trace_id, content)
+
+            yield "data: " + json.dumps({
+                "done": True,
+                "message_id": message_id,
+                "conversation_id": conversation_id,
+                "langfuse_trace_id": trace_id
+            }) + "\n\n"
+
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error("Chat stream endpoint error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
@@ -280,40 +555,41 @@ async def send_message(
 @router.post("/regenerate", response_model=ChatResponse)
 async def regenerate_message(
     regenerate_request: RegenerateRequest,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Regenerate an AI response for a specific message."""
     try:
-        # Get the original message
-        original_message = db.query(Message).filter(
-            Message.id == regenerate_request.message_id
-        ).first()
-        
-        if not original_message:
+        # Get the original message and its owning conversation in one round
+        # trip; joining on user_id doubles as the ownership check
+        result = await db.execute(
+            select(Message, Conversation).join(
+                Conversation, Message.conversation_id == Conversation.id
+            ).where(
+                Message.id == regenerate_request.message_id,
+                Conversation.user_id == current_user.id
+            )
+        )
+        row = result.first()
+
+        if not row:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Message not found"
             )
 
-        # Verify user owns the conversation
-        conversation = db.query(Conversation).filter(
-            Conversation.id == original_message.conversation_id,
-            Conversation.user_id == current_user.id
-        ).first()
-        
-        if not conversation:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied"
-            )
+        original_message, conversation = row
 
         # Get the user message that prompted this response
-        user_message = db.query(Message).filter(
-            Message.conversation_id == original_message.conversation_id,
-            Message.role == "user",
-            Message.id < original_message.id
-        ).order_by(Message.id.desc()).first()
+        result = await db.execute(
+            select(Message).where(
+                Message.conversation_id == original_message.conversation_id,
+                Message.role == "user",
+                Message.id < original_message.id
+            ).order_by(Message.id.desc()).limit(1)
+        )
+        user_message = result.scalars().first()
 
         if not user_message:
             raise HTTPException(
@@ -335,17 +611,12 @@ async def regenerate_message(
         )
 
         # Get conversation history (excluding the original response)
-        history_messages = db.query(Message).filter(
-            Message.conversation_id == conversation.id,
-            Message.id < user_message.id
-        ).order_by(Message.created_at.desc()).limit(10).all()
-        
-        conversation_history = []
-        for msg in reversed(history_messages):
-            conversation_history.append({
-                "role": msg.role,
-                "content": msg.content
-            })
+        conversation_history = await _fetch_history(db, conversation.id, user_message.id)
+
+        # Whatever the branch, the cached agent memory still holds the
+        # reply being regenerated; drop it so later turns rebuild from
+        # the database
+        llamaindex_service.discard_memory(conversation.id)
 
         # Handle auto mode regeneration
         if original_message.tool_used == "auto":
@@ -361,50 +632,50 @@ async def regenerate_message(
                     model=model_name
                 )
 
+                # Hoist the repeated ai_response lookups into locals so the
+                # logging payload and metadata reuse the same objects
+                get = ai_response.get
+                used_search = get("used_search", False)
+                agent_type = get("agent_type", "react")
+                fallback = get("fallback", False)
+                tool_calls = get("tool_calls", [])
+                reasoning_steps = get("reasoning_steps", [])
+
                 # Log agent reasoning in Langfuse
-                langfuse_service.log_agent_reasoning(
+                background_tasks.add_task(
+                    langfuse_service.log_agent_reasoning,
                     trace_id=trace_id,
-                    reasoning_steps=ai_response.get("reasoning_steps", []),
-                    tool_calls=ai_response.get("tool_calls", []),
+                    reasoning_steps=reasoning_steps,
+                    tool_calls=tool_calls,
                     agent_decision={
-                        "used_search": ai_response.get("used_search", False),
-                        "agent_type": ai_response.get("agent_type", "react"),
-                        "fallback": ai_response.get("fallback", False)
+                        "used_search": used_search,
+                        "agent_type": agent_type,
+                        "fallback": fallback
                     }
                 )
 
                 # Create new assistant message
-                new_message = Message(
+                new_schema = await _insert_assistant_message(
+                    db,
                     conversation_id=conversation.id,
-                    role="assistant",
                     content=ai_response["content"],
                     tool_used=original_message.tool_used,
-                    langfuse_trace_id=trace_id,
+                    trace_id=trace_id,
                     message_metadata={
                         "model": ai_response["model"],
                         "regenerated_from": original_message.id,
-                        "agent_type": ai_response.get("agent_type", "react"),
-                        "used_search": ai_response.get("used_search", False),
-                        "tool_calls": ai_response.get("tool_calls", []),
-                        "reasoning_steps": ai_response.get("reasoning_steps", []),
-                        "fallback": ai_response.get("fallback", False)
+                        "agent_type": agent_type,
+                        "used_search": used_search,
+                        "tool_calls": tool_calls,
+                        "reasoning_steps": reasoning_steps,
+                        "fallback": fallback
                     }
                 )
-                db.add(new_message)
-                db.commit()
-                db.refresh(new_message)
 
-                # Finalize Langfuse trace
-                langfuse_service.finalize_trace(trace_id, ai_response["content"])
-
-                return ChatResponse(
-                    message=MessageSchema.from_orm(new_message),
-                    conversation_id=conversation.id,
-                    langfuse_trace_id=trace_id
-                )
+                return _chat_response(background_tasks, new_schema, conversation.id, trace_id)
 
             except Exception as e:
-                logger.error(f"Auto mode regeneration failed: {e}")
+                logger.error("Auto mode regeneration failed: %s", e)
                 langfuse_service.log_error(trace_id, str(e), "auto_mode_regeneration_error")
                 raise HTTPException(
                     status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -420,44 +691,38 @@ async def regenerate_message(
                 search_metadata = original_message.message_metadata.get("search_results")
             
             # Create new assistant message with same search results
-            new_message = Message(
+            new_schema = await _insert_assistant_message(
+                db,
                 conversation_id=conversation.id,
-                role="assistant",
                 content=search_context,
                 tool_used=original_message.tool_used,
-                langfuse_trace_id=trace_id,
+                trace_id=trace_id,
                 message_metadata={
                     "search_results": search_metadata,
                     "regenerated_from": original_message.id,
                     "source": "internet_search"
                 }
             )
-            db.add(new_message)
-            db.commit()
-            db.refresh(new_message)
 
-            # Finalize Langfuse trace
-            langfuse_service.finalize_trace(trace_id, search_context)
-
-            return ChatResponse(
-                message=MessageSchema.from_orm(new_message),
-                conversation_id=conversation.id,
-                langfuse_trace_id=trace_id
-            )
+            return _chat_response(background_tasks, new_schema, conversation.id, trace_id)
 
         # Generate new AI response using Ollama (for "none" tool selection and other cases)
         else:  # This covers tool_used == "none" and any other values
             prompt = user_message.content
+            # This request repeats the original send verbatim; serving the
+            # cached answer back would defeat the point of regenerating
             ai_response = await ollama_service.generate_response(
                 prompt=prompt,
                 conversation_history=conversation_history,
                 model=regenerate_request.model,
-                system_message="You are a helpful AI assistant. Provide accurate and helpful responses."
+                system_message="You are a helpful AI assistant. Provide accurate and helpful responses.",
+                bypass_cache=True
             )
 
             # Log LLM generation in Langfuse
             input_messages = conversation_history + [{"role": "user", "content": prompt}]
-            langfuse_service.log_llm_generation(
+            background_tasks.add_task(
+                langfuse_service.log_llm_generation,
                 trace_id=trace_id,
                 model=ai_response["model"],
                 input_messages=input_messages,
@@ -466,12 +731,12 @@ async def regenerate_message(
             )
 
             # Create new assistant message
-            new_message = Message(
+            new_schema = await _insert_assistant_message(
+                db,
                 conversation_id=conversation.id,
-                role="assistant",
                 content=ai_response["content"],
                 tool_used=original_message.tool_used,
-                langfuse_trace_id=trace_id,
+                trace_id=trace_id,
                 message_metadata={
                     "model": ai_response["model"],
                     "regenerated_from": original_message.id,
@@ -483,23 +748,13 @@ async def regenerate_message(
                     }
                 }
             )
-            db.add(new_message)
-            db.commit()
-            db.refresh(new_message)
 
-            # Finalize Langfuse trace
-            langfuse_service.finalize_trace(trace_id, ai_response["content"])
-
-            return ChatResponse(
-                message=MessageSchema.from_orm(new_message),
-                conversation_id=conversation.id,
-                langfuse_trace_id=trace_id
-            )
+            return _chat_response(background_tasks, new_schema, conversation.id, trace_id)
 
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Regenerate endpoint error: {e}")
+        logger.error("Regenerate endpoint error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Internal server error"
@@ -509,43 +764,33 @@ async def regenerate_message(
 @router.get("/models")
 async def get_available_models():
     """Get list of available Ollama models and tools."""
+    global _models_cache
     try:
-        models = await ollama_service.list_models()
-        ollama_models = [
-            {
-                "name": model["name"],
-                "size": model.get("size", 0),
-                "modified_at": model.get("modified_at", ""),
-                "type": "ollama"
-            }
-            for model in models
-        ]
-        
-        # Add tool options
-        tool_options = [
-            {
-                "name": "auto",
-                "size": 0,
-                "modified_at": "",
-                "type": "tool",
-                "description": "AI automatically decides when to use internet search"
-            },
-            {
-                "name": "internet",
-                "size": 0,
-                "modified_at": "",
-                "type": "tool",
-                "description": "Direct internet search"
+        async with _models_lock:
+            now = time.monotonic()
+            if _models_cache and now - _models_cache[0] < _MODELS_CACHE_TTL:
+                return _models_cache[1]
+
+            models = await ollama_service.list_models()
+            ollama_models = [
+                {
+                    "name": model["name"],
+                    "size": model.get("size", 0),
+                    "modified_at": model.get("modified_at", ""),
+                    "type": "ollama"
+                }
+                for model in models
+            ]
+
+            response = {
+                "models": ollama_models + _TOOL_OPTIONS,
+                "default_model": "auto",
+                "default_ollama_model": ollama_service.default_model
             }
-        ]
-        
-        return {
-            "models": ollama_models + tool_options,
-            "default_model": "auto",
-            "default_ollama_model": ollama_service.default_model
-        }
+            _models_cache = (now, response)
+            return response
     except Exception as e:
-        logger.error(f"Failed to get models: {e}")
+        logger.error("Failed to get models: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get available models: {str(e)}"
@@ -1,7 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from app.database import get_db
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy import select, insert, delete, exists, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import load_only, selectinload
+from typing import Dict, List, Optional, Tuple
+from app.database import get_async_db
 from app.middleware.auth_middleware import get_current_active_user
 from app.models.user import User
 from app.models.conversation import Conversation
@@ -9,244 +13,397 @@ from app.models.message import Message
 from app.schemas.conversation import (
     Conversation as ConversationSchema,
     ConversationCreate,
-    ConversationUpdate,
-    ConversationWithMessages
+    ConversationUpdate
 )
-from app.schemas.chat import Message as MessageSchema
+from app.services.llamaindex_service import llamaindex_service
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/conversations", tags=["conversations"])
 
+# Built once at import: validates ORM rows and serializes the whole list to
+# JSON bytes in pydantic-core, instead of per-row model_validate/model_dump
+# followed by a separate encode
+_CONVS_ADAPTER = TypeAdapter(List[ConversationSchema])
 
-@router.get("/", response_model=List[ConversationSchema])
-def get_conversations(
+# Markdown-export building blocks, pre-encoded to bytes so the per-message
+# loop is dict lookups plus bulk bytes joins — no f-string formatting or
+# str→bytes conversion at response time
+_ROLE_HEADERS = {
+    "user": "## 🧑 User\n\n".encode(),
+    "assistant": "## 🤖 Assistant\n\n".encode(),
+    "system": "## ⚙️ System\n\n".encode(),
+}
+_EXPORT_SEPARATOR = b"---\n\n"
+_EXPORT_TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Short-lived per-user cache for the first page of the conversation list.
+# The sidebar polls this endpoint, so most hits are identical back-to-back
+# queries; 30 s of staleness is invisible there and writes in this module
+# invalidate eagerly. Keyed by (user_id, limit) — only skip == 0 is cached.
+# Bounded: entries for users who stop polling would otherwise sit in the
+# dict (full serialized page bodies) forever.
+_LIST_CACHE_TTL = 30.0
+_LIST_CACHE_MAX = 1024
+_list_cache: Dict[Tuple[int, int], Tuple[float, bytes, int]] = {}
+
+
+def invalidate_list_cache(user_id: int) -> None:
+    """Drop cached conversation-list pages for one user.
+
+    Also called from the chat endpoints: sending a message can create a
+    conversation or reorder the list, and the sidebar must not serve the
+    pre-send page for the rest of the TTL.
+    """
+    for key in [key for key in _list_cache if key[0] == user_id]:
+        _list_cache.pop(key, None)
+
+
+def _message_dict(message: Message) -> dict:
+    """Serialize a Message row to a plain dict for orjson.
+
+    The values come straight from our own database, so a per-row pydantic
+    validation pass adds cost without catching anything.
+    """
+    return {
+        "id": message.id,
+        "conversation_id": message.conversation_id,
+        "role": message.role,
+        "content": message.content,
+        "tool_used": message.tool_used,
+        "langfuse_trace_id": message.langfuse_trace_id,
+        "message_metadata": message.message_metadata,
+        "created_at": message.created_at
+    }
+
+
+@router.get("/")
+async def get_conversations(
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=100),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get all conversations for the current user with pagination."""
-    conversations = db.query(Conversation).filter(
-        Conversation.user_id == current_user.id
-    ).order_by(
-        Conversation.updated_at.desc()
-    ).offset(skip).limit(limit).all()
-    
-    return conversations
+    cache_key = (current_user.id, limit)
+    if skip == 0:
+        cached = _list_cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[0] < _LIST_CACHE_TTL:
+            return Response(
+                cached[1],
+                media_type="application/json",
+                headers={"X-Total-Count": str(cached[2])}
+            )
+
+    # Project exactly the columns the payload needs; keeps rows lean if the
+    # model ever grows wide columns. The windowed count() rides along in the
+    # same SELECT, so the total costs no second COUNT(*) scan.
+    rows = (await db.execute(
+        select(Conversation, func.count().over().label("total_count")).options(
+            load_only(
+                Conversation.id,
+                Conversation.user_id,
+                Conversation.title,
+                Conversation.langfuse_session_id,
+                Conversation.created_at,
+                Conversation.updated_at
+            )
+        ).where(
+            Conversation.user_id == current_user.id
+        ).order_by(
+            Conversation.updated_at.desc()
+        ).offset(skip).limit(limit)
+    )).all()
+    if rows:
+        total = rows[0].total_count
+    else:
+        # The windowed count only exists when the page has rows; past the
+        # last page, fall back to a plain COUNT so the header stays truthful
+        total = (await db.execute(
+            select(func.count()).select_from(Conversation).where(
+                Conversation.user_id == current_user.id
+            )
+        )).scalar_one()
+
+    # One validate_python + dump_json pass through the pre-built adapter
+    # emits the response bytes directly, skipping FastAPI's encoder path
+    body = _CONVS_ADAPTER.dump_json(
+        _CONVS_ADAPTER.validate_python(
+            [row.Conversation for row in rows],
+            from_attributes=True
+        )
+    )
+    if skip == 0:
+        now = time.monotonic()
+        if len(_list_cache) >= _LIST_CACHE_MAX:
+            # Drop expired entries; fall back to clearing if still full
+            live = {
+                k: v for k, v in _list_cache.items()
+                if now - v[0] < _LIST_CACHE_TTL
+            }
+            _list_cache.clear()
+            if len(live) < _LIST_CACHE_MAX:
+                _list_cache.update(live)
+        _list_cache[cache_key] = (now, body, total)
+    return Response(
+        body,
+        media_type="application/json",
+        headers={"X-Total-Count": str(total)}
+    )
 
 
 @router.post("/", response_model=ConversationSchema, status_code=status.HTTP_201_CREATED)
-def create_conversation(
+async def create_conversation(
     conversation: ConversationCreate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new conversation."""
-    db_conversation = Conversation(
-        user_id=current_user.id,
-        title=conversation.title
-    )
-    db.add(db_conversation)
-    db.commit()
-    db.refresh(db_conversation)
+    # INSERT ... RETURNING hands back the server-populated columns (id,
+    # timestamps) in the same statement, where db.refresh would re-SELECT
+    db_conversation = (await db.execute(
+        insert(Conversation).values(
+            user_id=current_user.id,
+            title=conversation.title
+        ).returning(Conversation)
+    )).scalar_one()
+    await db.commit()
+    invalidate_list_cache(current_user.id)
     return db_conversation
 
 
-@router.get("/{conversation_id}", response_model=ConversationWithMessages)
-def get_conversation(
+@router.get("/{conversation_id}")
+async def get_conversation(
     conversation_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get a specific conversation with all its messages."""
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.user_id == current_user.id
-    ).first()
-    
+    # selectinload batches the messages into one IN(...) SELECT instead of
+    # a second query (or a lazy load per relationship access)
+    conversation = (await db.execute(
+        select(Conversation).options(
+            selectinload(Conversation.messages)
+        ).where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == current_user.id
+        )
+    )).scalars().first()
+
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
-    
-    # Get messages for this conversation
-    messages = db.query(Message).filter(
-        Message.conversation_id == conversation_id
-    ).order_by(Message.created_at.asc()).all()
-    
-    # Convert to schema
-    conversation_dict = {
+
+    messages = conversation.messages
+
+    # Build the payload directly; orjson serializes datetimes natively
+    return ORJSONResponse({
         "id": conversation.id,
         "user_id": conversation.user_id,
         "title": conversation.title,
         "langfuse_session_id": conversation.langfuse_session_id,
         "created_at": conversation.created_at,
         "updated_at": conversation.updated_at,
-        "messages": [MessageSchema.from_orm(msg) for msg in messages]
-    }
-    
-    return ConversationWithMessages(**conversation_dict)
+        "messages": [_message_dict(msg) for msg in messages]
+    })
 
 
-@router.get("/{conversation_id}/messages", response_model=List[MessageSchema])
-def get_conversation_messages(
+@router.get("/{conversation_id}/messages")
+async def get_conversation_messages(
     conversation_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=500),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get messages for a specific conversation with pagination."""
-    # Verify user owns the conversation
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.user_id == current_user.id
-    ).first()
-    
-    if not conversation:
+    # Verify user owns the conversation; EXISTS returns a bare boolean
+    # instead of materializing a row
+    owns_conversation = (await db.execute(
+        select(
+            exists().where(
+                Conversation.id == conversation_id,
+                Conversation.user_id == current_user.id
+            )
+        )
+    )).scalar()
+
+    if not owns_conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
-    
-    messages = db.query(Message).filter(
-        Message.conversation_id == conversation_id
-    ).order_by(
-        Message.created_at.asc()
-    ).offset(skip).limit(limit).all()
-    
-    return [MessageSchema.from_orm(msg) for msg in messages]
+
+    messages = (await db.execute(
+        select(Message).options(
+            load_only(
+                Message.id,
+                Message.conversation_id,
+                Message.role,
+                Message.content,
+                Message.tool_used,
+                Message.langfuse_trace_id,
+                Message.message_metadata,
+                Message.created_at
+            )
+        ).where(
+            Message.conversation_id == conversation_id
+        ).order_by(
+            Message.created_at.asc()
+        ).offset(skip).limit(limit)
+    )).scalars().all()
+
+    return ORJSONResponse([_message_dict(msg) for msg in messages])
 
 
 @router.put("/{conversation_id}", response_model=ConversationSchema)
-def update_conversation(
+async def update_conversation(
     conversation_id: int,
     conversation_update: ConversationUpdate,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update a conversation (e.g., change title)."""
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.user_id == current_user.id
-    ).first()
-    
+    conversation = (await db.execute(
+        select(Conversation).where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == current_user.id
+        )
+    )).scalars().first()
+
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
-    
+
     # Update fields if provided
     if conversation_update.title is not None:
         conversation.title = conversation_update.title
-    
-    db.commit()
-    db.refresh(conversation)
+
+    await db.commit()
+    await db.refresh(conversation)
+    invalidate_list_cache(current_user.id)
     return conversation
 
 
 @router.delete("/{conversation_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_conversation(
+async def delete_conversation(
     conversation_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a conversation and all its messages."""
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.user_id == current_user.id
-    ).first()
-    
-    if not conversation:
+    # Single statement: ownership check and delete in one round trip, with
+    # the FK's ON DELETE CASCADE removing the messages database-side
+    row = (await db.execute(
+        delete(Conversation).where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == current_user.id
+        ).returning(Conversation.id)
+    )).first()
+
+    if not row:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
-    
-    # Delete all messages in the conversation (cascade should handle this)
-    db.query(Message).filter(Message.conversation_id == conversation_id).delete()
-    
-    # Delete the conversation
-    db.delete(conversation)
-    db.commit()
-    
+
+    await db.commit()
+    invalidate_list_cache(current_user.id)
+    llamaindex_service.discard_memory(conversation_id)
     return None
 
 
 @router.delete("/{conversation_id}/messages/{message_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_message(
+async def delete_message(
     conversation_id: int,
     message_id: int,
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a specific message from a conversation."""
-    # Verify user owns the conversation
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.user_id == current_user.id
-    ).first()
-    
-    if not conversation:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Conversation not found"
-        )
-    
-    # Find and delete the message
-    message = db.query(Message).filter(
-        Message.id == message_id,
-        Message.conversation_id == conversation_id
-    ).first()
-    
-    if not message:
+    # One DELETE with a correlated ownership check instead of two SELECTs
+    # followed by a delete
+    row = (await db.execute(
+        delete(Message).where(
+            Message.id == message_id,
+            Message.conversation_id == conversation_id,
+            exists(
+                select(Conversation.id).where(
+                    Conversation.id == conversation_id,
+                    Conversation.user_id == current_user.id
+                )
+            )
+        ).returning(Message.id)
+    )).first()
+
+    if not row:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Message not found"
         )
-    
-    db.delete(message)
-    db.commit()
-    
+
+    await db.commit()
+    # The cached agent memory may still contain the deleted message; drop
+    # it so the next auto turn rebuilds from the database
+    llamaindex_service.discard_memory(conversation_id)
     return None
 
 
 @router.get("/{conversation_id}/export")
-def export_conversation(
+async def export_conversation(
     conversation_id: int,
     format: str = Query("json", regex="^(json|markdown)$"),
     current_user: User = Depends(get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Export a conversation in JSON or Markdown format."""
     # Verify user owns the conversation
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.user_id == current_user.id
-    ).first()
-    
+    conversation = (await db.execute(
+        select(Conversation).where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == current_user.id
+        )
+    )).scalars().first()
+
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
-    
-    # Get all messages
-    messages = db.query(Message).filter(
-        Message.conversation_id == conversation_id
-    ).order_by(Message.created_at.asc()).all()
-    
+
+    # Core column rows: exports can be large, so skip ORM instance
+    # construction and identity tracking entirely
+    messages = (await db.execute(
+        select(
+            Message.id,
+            Message.role,
+            Message.content,
+            Message.tool_used,
+            Message.langfuse_trace_id,
+            Message.message_metadata,
+            Message.created_at
+        ).where(
+            Message.conversation_id == conversation_id
+        ).order_by(Message.id.asc())
+    )).all()
+
     if format == "json":
-        return {
+        # Hand orjson raw datetime values; it renders ISO 8601 natively in
+        # Rust, so no per-message isoformat() string allocations
+        return ORJSONResponse({
             "conversation": {
                 "id": conversation.id,
                 "title": conversation.title,
-                "created_at": conversation.created_at.isoformat(),
-                "updated_at": conversation.updated_at.isoformat(),
+                "created_at": conversation.created_at,
+                "updated_at": conversation.updated_at,
                 "langfuse_session_id": conversation.langfuse_session_id
             },
             "messages": [
@@ -257,32 +414,42 @@ def export_conversation(
                     "tool_used": msg.tool_used,
                     "langfuse_trace_id": msg.langfuse_trace_id,
                     "metadata": msg.message_metadata,
-                    "created_at": msg.created_at.isoformat()
+                    "created_at": msg.created_at
                 }
                 for msg in messages
             ]
-        }
-    
+        })
+
     elif format == "markdown":
-        markdown_content = f"# {conversation.title or f'Conversation {conversation.id}'}\n\n"
-        markdown_content += f"**Created:** {conversation.created_at.strftime('%Y-%m-%d %H:%M:%S')}\n"
-        markdown_content += f"**Updated:** {conversation.updated_at.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-        markdown_content += "---\n\n"
-        
-        for msg in messages:
-            role_emoji = "🧑" if msg.role == "user" else "🤖" if msg.role == "assistant" else "⚙️"
-            role_title = msg.role.title()
-            
-            markdown_content += f"## {role_emoji} {role_title}\n\n"
-            markdown_content += f"{msg.content}\n\n"
-            
-            if msg.tool_used and msg.tool_used != "none":
-                markdown_content += f"*Tool used: {msg.tool_used}*\n\n"
-            
-            markdown_content += f"*{msg.created_at.strftime('%Y-%m-%d %H:%M:%S')}*\n\n"
-            markdown_content += "---\n\n"
-        
-        return {
-            "content": markdown_content,
-            "filename": f"conversation_{conversation_id}.md"
-        }
+        def generate_markdown():
+            # Stream per-message chunks so long chats never build a single
+            # monolithic body in memory. Everything is yielded as bytes so
+            # the response layer does no str→bytes conversion.
+            yield (
+                f"# {conversation.title or f'Conversation {conversation.id}'}\n\n"
+                f"**Created:** {conversation.created_at.strftime(_EXPORT_TS_FORMAT)}\n"
+                f"**Updated:** {conversation.updated_at.strftime(_EXPORT_TS_FORMAT)}\n\n"
+            ).encode()
+            yield _EXPORT_SEPARATOR
+
+            header_for = _ROLE_HEADERS.get
+            for msg in messages:
+                header = header_for(msg.role)
+                if header is None:
+                    header = f"## ⚙️ {msg.role.title()}\n\n".encode()
+                created = msg.created_at.strftime(_EXPORT_TS_FORMAT)
+
+                parts = [header, msg.content.encode(), b"\n\n"]
+                if msg.tool_used and msg.tool_used != "none":
+                    parts.append(f"*Tool used: {msg.tool_used}*\n\n".encode())
+                parts.append(f"*{created}*\n\n".encode())
+                parts.append(_EXPORT_SEPARATOR)
+                yield b"".join(parts)
+
+        return StreamingResponse(
+            generate_markdown(),
+            media_type="text/markdown",
+            headers={
+                "Content-Disposition": f'attachment; filename="conversation_{conversation_id}.md"'
+            }
+        )
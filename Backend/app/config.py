@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import field_validator
 from typing import List
@@ -15,11 +16,16 @@ class Settings(BaseSettings):
     
     # Tavily Search
     tavily_api_key: str
+    # How long identical search queries are served from the in-process
+    # cache instead of re-hitting the paid API
+    search_cache_ttl: float = 900.0
     
     # Langfuse
     langfuse_public_key: str
     langfuse_secret_key: str
     langfuse_host: str
+    # Optional spill file for queued traces; empty disables disk spill
+    langfuse_spill_path: str = ""
     
     # JWT
     jwt_secret_key: str
@@ -36,10 +42,24 @@ class Settings(BaseSettings):
     project_name: str = "AI Chat App"
     version: str = "1.0.0"
     
+    # Opt-in semantic response cache: near-duplicate prompts reuse a prior
+    # Ollama response when their embeddings are close enough. Only applied
+    # to prompts without conversation history — the match ignores history,
+    # so context-dependent prompts could otherwise reuse an answer
+    # generated in a different conversation
+    semantic_cache_enabled: bool = False
+
+    # Outbound HTTP pool (shared by the Ollama/Tavily clients)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 40
+    http_keepalive_expiry: float = 30.0
+    # HTTP/2 multiplexing on the shared pool; needs the httpx[http2] extra
+    http2_enabled: bool = False
+
     # LlamaIndex Configuration
     chat_memory_buffer_size: int = 20
     llamaindex_max_iterations: int = 5
-    llamaindex_verbose: bool = True
+    llamaindex_verbose: bool = False
     
     @field_validator('cors_origins', mode='before')
     @classmethod
@@ -61,8 +81,19 @@ class Settings(BaseSettings):
         extra="ignore",
     )
 
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Build the Settings singleton.
+
+    Constructing Settings parses .env plus the environment and runs every
+    validator; the lru_cache makes that a one-time cost per process no
+    matter how often callers (or reload cycles) ask for it.
+    """
+    return Settings()
+
+
 # Global settings instance
 # Settings will automatically load from .env file and environment variables
 # Environment variables take precedence over .env file values
-settings = Settings()
+settings = get_settings()
 
@@ -1,19 +1,66 @@
+import orjson
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
+
+def _async_database_url(url: str) -> str:
+    """Map the configured database URL to its async driver equivalent."""
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+
+def _json_serializer(obj) -> str:
+    """Serialize JSON columns with orjson (drivers expect str, not bytes)."""
+    return orjson.dumps(obj).decode()
+
+
 # Create SQLAlchemy engine
 engine = create_engine(
     settings.database_url,
     pool_pre_ping=True,
     pool_recycle=300,
-    echo=settings.debug
+    echo=settings.debug,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads
+)
+
+# Async engine for endpoints that await external services (chat path);
+# keeps the event loop free during long LLM calls instead of parking a worker thread
+_async_engine_kwargs = {
+    "pool_pre_ping": True,
+    "pool_recycle": 300,
+    "echo": settings.debug,
+    "json_serializer": _json_serializer,
+    "json_deserializer": orjson.loads,
+}
+if not settings.database_url.startswith("sqlite"):
+    # SQLite uses a static pool that rejects sizing arguments.
+    # A fixed pool of 25 (no overflow) keeps connection count predictable
+    # under load instead of bursting past what Postgres is tuned for.
+    _async_engine_kwargs.update(pool_size=25, max_overflow=0)
+
+async_engine = create_async_engine(
+    _async_database_url(settings.database_url),
+    **_async_engine_kwargs
 )
 
 # Create SessionLocal class
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async session factory; expire_on_commit=False keeps ORM objects usable
+# after commit without an extra SELECT
+AsyncSessionLocal = async_sessionmaker(
+    autoflush=False,
+    expire_on_commit=False,
+    bind=async_engine
+)
+
 # Create Base class for models
 Base = declarative_base()
 
@@ -27,6 +74,12 @@ def get_db():
         db.close()
 
 
+# Dependency to get an async database session
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
 # Function to create all tables
 def create_tables():
     """Create all database tables if they don't exist."""
@@ -1,22 +1,63 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.config import settings
 from app.api import auth, chat, conversations, health
+from app.services.http_client import close_shared_client
 from app.services.ollama_service import ollama_service
-from app.services.search_service import search_service
 from app.database import create_tables
+import asyncio
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup/shutdown, replacing the deprecated on_event hooks."""
+    logger.info("Starting AI Chat App Backend...")
+    logger.info(f"Environment: {settings.environment}")
+    logger.info(f"Debug mode: {settings.debug}")
+    logger.info(f"API prefix: {settings.api_v1_prefix}")
+
+    # Create database tables if they don't exist; the sync engine call runs
+    # in a worker thread so startup doesn't block the event loop
+    try:
+        await asyncio.to_thread(create_tables)
+        logger.info("Database tables created/verified successfully")
+    except Exception as e:
+        logger.error(f"Error creating database tables: {e}")
+        raise
+
+    # Pre-warm the default model in the background so the first user
+    # message doesn't pay the weight-loading delay; startup doesn't wait
+    warmup_task = asyncio.create_task(ollama_service.warmup())
+
+    yield
+
+    warmup_task.cancel()
+
+    logger.info("Shutting down AI Chat App Backend...")
+
+    # Close the shared HTTP client used by the outbound services
+    try:
+        await close_shared_client()
+        logger.info("Shared HTTP client closed")
+    except Exception as e:
+        logger.error(f"Error closing shared HTTP client: {e}")
+
+
 # Create FastAPI app
 app = FastAPI(
     title=settings.project_name,
     version=settings.version,
     description="AI Chat App Backend with Ollama, Tavily Search, and Langfuse integration",
-    openapi_url=f"{settings.api_v1_prefix}/openapi.json"
+    openapi_url=f"{settings.api_v1_prefix}/openapi.json",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
 
@@ -47,42 +88,6 @@ async def root():
     }
 
 
-@app.on_event("startup")
-async def startup_event():
-    """Startup event handler."""
-    logger.info("Starting AI Chat App Backend...")
-    logger.info(f"Environment: {settings.environment}")
-    logger.info(f"Debug mode: {settings.debug}")
-    logger.info(f"API prefix: {settings.api_v1_prefix}")
-    
-    # Create database tables if they don't exist
-    try:
-        create_tables()
-        logger.info("Database tables created/verified successfully")
-    except Exception as e:
-        logger.error(f"Error creating database tables: {e}")
-        raise
-
-
-@app.on_event("shutdown")
-async def shutdown_event():
-    """Shutdown event handler."""
-    logger.info("Shutting down AI Chat App Backend...")
-    
-    # Close HTTP clients
-    try:
-        await ollama_service.close()
-        logger.info("Ollama service client closed")
-    except Exception as e:
-        logger.error(f"Error closing Ollama service: {e}")
-    
-    try:
-        await search_service.close()
-        logger.info("Search service client closed")
-    except Exception as e:
-        logger.error(f"Error closing Search service: {e}")
-
-
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, JSON, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -6,14 +7,20 @@ from app.database import Base
 
 class Message(Base):
     __tablename__ = "messages"
+    __table_args__ = (
+        # Covers the "last N messages of a conversation" history queries
+        Index("ix_messages_conv_created", "conversation_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
+    # ON DELETE CASCADE lets conversation deletion be a single DELETE statement
+    conversation_id = Column(Integer, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False)
     role = Column(String, nullable=False)  # 'user', 'assistant', 'system'
     content = Column(Text, nullable=False)
     tool_used = Column(String, nullable=True, default="none")  # 'none', 'internet'
-    langfuse_trace_id = Column(String, nullable=True, index=True)  # Links to Langfuse trace
-    message_metadata = Column(JSON, nullable=True)  # For search results, token usage, etc.
+    langfuse_trace_id = Column(String, nullable=True)  # Links to Langfuse trace (write-only, not indexed)
+    # JSONB on Postgres avoids re-parsing large metadata blobs on every read
+    message_metadata = Column(JSON().with_variant(JSONB(), "postgresql"), nullable=True)  # For search results, token usage, etc.
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -1,3 +1,4 @@
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from app.models.user import User
@@ -5,6 +6,28 @@ from app.schemas.user import UserCreate, UserLogin
 from app.utils.security import verify_password, get_password_hash, create_access_token
 from datetime import timedelta
 from app.config import settings
+import hashlib
+import hmac
+import time
+
+# Short-lived cache of successful password verifications so a client logging
+# in repeatedly pays bcrypt (~100 ms) once per minute instead of per request.
+# Entries are keyed by an HMAC (secret-keyed, truncated) over the email, a
+# digest of the submitted password, and the stored hash — the hash in the key
+# means a password change invalidates naturally, and memory disclosure yields
+# only HMAC output, never password material. Failures are never cached.
+_VERIFY_CACHE_TTL = 60.0
+_VERIFY_CACHE_MAX = 1024
+_verify_cache = {}
+
+
+def _verify_cache_key(email: str, password: str, hashed_password: str) -> str:
+    material = f"{email}:{hashlib.sha256(password.encode()).hexdigest()}:{hashed_password}"
+    return hmac.new(
+        settings.jwt_secret_key.encode(),
+        material.encode(),
+        hashlib.sha256
+    ).hexdigest()[:32]
 
 
 class AuthService:
@@ -19,15 +42,16 @@ class AuthService:
                 detail="Email already registered"
             )
         
-        # Create new user
+        # Create new user; RETURNING picks up the server-generated columns
+        # without the extra SELECT a db.refresh would issue
         hashed_password = get_password_hash(user.password)
-        db_user = User(
-            email=user.email,
-            hashed_password=hashed_password
-        )
-        db.add(db_user)
+        db_user = db.execute(
+            insert(User).values(
+                email=user.email,
+                hashed_password=hashed_password
+            ).returning(User)
+        ).scalar_one()
         db.commit()
-        db.refresh(db_user)
         return db_user
 
     @staticmethod
@@ -39,11 +63,22 @@ class AuthService:
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect email or password"
             )
-        if not verify_password(password, user.hashed_password):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Incorrect email or password"
-            )
+        cache_key = _verify_cache_key(email, password, user.hashed_password)
+        now = time.monotonic()
+        expires_at = _verify_cache.get(cache_key)
+        if expires_at is None or expires_at <= now:
+            if not verify_password(password, user.hashed_password):
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Incorrect email or password"
+                )
+            if len(_verify_cache) >= _VERIFY_CACHE_MAX:
+                # Drop expired entries; fall back to clearing if still full
+                live = {k: v for k, v in _verify_cache.items() if v > now}
+                _verify_cache.clear()
+                if len(live) < _VERIFY_CACHE_MAX:
+                    _verify_cache.update(live)
+            _verify_cache[cache_key] = now + _VERIFY_CACHE_TTL
         if not user.is_active:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,141 @@
+import asyncio
+import random
+import time
+
+import httpx
+
+from app.config import settings
+
+_LIMITS = httpx.Limits(
+    max_connections=settings.http_max_connections,
+    max_keepalive_connections=settings.http_max_keepalive_connections,
+    keepalive_expiry=settings.http_keepalive_expiry
+)
+
+# Single pooled AsyncClient shared by the outbound-HTTP services (Ollama,
+# Tavily search). Reusing one connection pool avoids paying a TCP/TLS
+# handshake per call and keeps keepalive connections warm across services.
+# With http2_enabled, concurrent requests to HTTP/2-capable hosts (Tavily's
+# edge) multiplex over one TLS connection instead of opening several.
+# Constructing the client at import time is safe: httpx binds connections
+# to an event loop lazily on first request, not at construction, so the
+# pool always lives on the loop uvicorn actually runs. Closed via
+# close_shared_client() in the app's lifespan shutdown.
+# Staged default timeout: a dead peer fails at connect within seconds
+# instead of eating the whole read budget, while long LLM generations
+# still get their 120 s of read time.
+# Compression: httpx negotiates gzip/deflate out of the box and adds
+# brotli to Accept-Encoding automatically when the brotli extra is
+# installed (see requirements.txt) — Tavily's multi-KB text payloads
+# shrink several-fold on the wire with no code here.
+shared_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(connect=3.0, read=120.0, write=10.0, pool=5.0),
+    limits=_LIMITS,
+    http2=settings.http2_enabled
+)
+
+# Sync counterpart for SDKs that run on worker threads and accept an
+# injected httpx.Client (Langfuse). Same pool limits, same rationale:
+# keepalive reuse instead of a handshake per flush.
+shared_sync_client = httpx.Client(
+    timeout=httpx.Timeout(connect=3.0, read=120.0, write=10.0, pool=5.0),
+    limits=_LIMITS
+)
+
+
+async def close_shared_client():
+    """Close the shared HTTP clients. Called once at application shutdown."""
+    await shared_client.aclose()
+    shared_sync_client.close()
+
+
+# Transient upstream failures worth one more try: rate limiting and
+# gateway-level errors. Anything else returns to the caller untouched.
+_RETRY_STATUSES = frozenset((429, 502, 503, 504))
+_RETRY_ATTEMPTS = 3
+_RETRY_BASE = 0.2
+_RETRY_MAX = 2.0
+# Cap on how long a Retry-After header can make us wait
+_RETRY_AFTER_MAX = 10.0
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling upstream while a circuit is open."""
+
+
+class CircuitBreaker:
+    """Minimal async circuit breaker for an outbound dependency.
+
+    Opens after `threshold` consecutive failures; while open, entering the
+    context raises CircuitOpenError immediately so callers fail in
+    microseconds instead of waiting out a long timeout against a dead
+    upstream. After `cooldown` seconds one trial call is let through: its
+    success closes the circuit, its failure re-opens it.
+
+    Used as `async with breaker:` — any exception leaving the block counts
+    as a failure, a clean exit as a success.
+    """
+
+    def __init__(self, name: str, threshold: int = 5, cooldown: float = 30.0):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = 0.0
+
+    @property
+    def is_open(self) -> bool:
+        return (
+            self._failures >= self.threshold
+            and time.monotonic() - self._opened_at < self.cooldown
+        )
+
+    async def __aenter__(self):
+        if self.is_open:
+            raise CircuitOpenError(
+                f"{self.name} is unavailable (circuit open after "
+                f"{self._failures} consecutive failures)"
+            )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._failures = 0
+        elif not issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            # Cancellation means the caller went away (client disconnect,
+            # abandoned stream), not that upstream failed — counting it
+            # would open the circuit against a healthy server
+            self._failures += 1
+            if self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+        return False
+
+
+async def post_with_retries(client: httpx.AsyncClient, url: str, **kwargs) -> httpx.Response:
+    """POST with exponential backoff and jitter on transient failures.
+
+    Retries network-level errors and retryable status codes up to three
+    attempts, honoring a numeric Retry-After header when the server sends
+    one. The final attempt's response or exception is surfaced unchanged,
+    so callers keep their existing raise_for_status handling.
+    """
+    for attempt in range(_RETRY_ATTEMPTS):
+        last = attempt == _RETRY_ATTEMPTS - 1
+        try:
+            response = await client.post(url, **kwargs)
+        except httpx.TransportError:
+            if last:
+                raise
+        else:
+            if response.status_code not in _RETRY_STATUSES or last:
+                return response
+            retry_after = response.headers.get("Retry-After")
+            if retry_after is not None:
+                try:
+                    await asyncio.sleep(min(float(retry_after), _RETRY_AFTER_MAX))
+                    continue
+                except ValueError:
+                    pass
+        delay = min(_RETRY_BASE * (2 ** attempt), _RETRY_MAX)
+        # Half-to-full jitter keeps concurrent retries from synchronizing
+        await asyncio.sleep(delay * (0.5 + random.random() / 2))
@@ -1,12 +1,40 @@
 import logging
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Tuple
 from app.config import settings
 import asyncio
+import re
+import time
 
 logger = logging.getLogger(__name__)
 
 
 class LlamaIndexService:
+    # Search-intent indicators compiled into one pattern: a single C-level
+    # scan over the prompt instead of one substring pass per indicator, and
+    # IGNORECASE spares the lowered copy of the prompt
+    _SEARCH_INTENT_RE = re.compile(
+        r"\b(" + "|".join(map(re.escape, (
+            "current", "today", "now", "latest", "recent", "news",
+            "weather", "stock", "price", "what's happening",
+            "update", "2024", "2025", "this year", "this month"
+        ))) + r")\b",
+        re.IGNORECASE
+    )
+
+    # ReAct transcript markers at line starts; one scan instead of two
+    # substring passes per message
+    _REASONING_RE = re.compile(r"^(?:Thought|Action):", re.MULTILINE)
+
+    # Tavily tool results cached briefly: the agent re-issues identical
+    # queries across iterations and regenerations often enough that the
+    # repeat HTTP round trip is pure waste
+    _TOOL_CACHE_TTL = 120.0
+    _TOOL_CACHE_MAX = 256
+
+    # Pseudo-model names routed to mode selection rather than Ollama
+    _RESERVED_MODELS = frozenset(("auto", "internet"))
+
     def __init__(self):
         self.ollama_base_url = settings.ollama_base_url
         self.default_model = settings.ollama_default_model
@@ -18,7 +46,20 @@ class LlamaIndexService:
         self.agent = None
         self.tavily_tools = None
         self._initialized = False
-        
+        self._init_lock = asyncio.Lock()
+
+        # Per-conversation ChatMemoryBuffer, reused across turns so each call
+        # appends to existing memory instead of rebuilding the buffer from
+        # the full window. Ordered for LRU eviction.
+        self._memories: "OrderedDict[int, Any]" = OrderedDict()
+        self._memories_max = 128
+
+        # Last formatted history: (raw message dicts, built ChatMessages).
+        # Consecutive turns share all but the newest messages, so the next
+        # call only builds the tail instead of the whole window.
+        self._hist_cache: Tuple[List[Dict[str, str]], List] = ([], [])
+        self._role_map = None  # built lazily with the deferred imports
+
         # Don't initialize components immediately to avoid import-time errors
     
     def _initialize_components(self):
@@ -33,6 +74,10 @@ class LlamaIndexService:
             # Note: LlamaIndex's Ollama wrapper uses /api/chat endpoint
             # Ensure Ollama is updated to a version that supports /api/chat
             # or the model is properly loaded
+            # The wrapper can't share the app's pooled httpx client: the
+            # pinned llama-index-llms-ollama 0.1.6 opens a fresh
+            # httpx.Client inside each chat/complete call and exposes no
+            # client kwarg to inject one.
             try:
                 self.llm = Ollama(
                     model=self.default_model,
@@ -48,7 +93,9 @@ class LlamaIndexService:
             if self.tavily_api_key:
                 try:
                     tavily_spec = TavilyToolSpec(api_key=self.tavily_api_key)
-                    self.tavily_tools = tavily_spec.to_tool_list()
+                    self.tavily_tools = [
+                        self._cache_tool(tool) for tool in tavily_spec.to_tool_list()
+                    ]
                     logger.info(f"Initialized {len(self.tavily_tools)} Tavily tools")
                 except Exception as e:
                     logger.warning(f"Failed to initialize Tavily tools: {e}")
@@ -59,11 +106,15 @@ class LlamaIndexService:
             
             # Initialize ReAct agent with tools
             try:
+                # verbose prints every thought/action step to stdout, which
+                # is a synchronous flush per agent step on the request path;
+                # keep it opt-in for debugging
+                verbose = settings.llamaindex_verbose
                 if self.tavily_tools:
                     self.agent = ReActAgent.from_tools(
                         self.tavily_tools,
                         llm=self.llm,
-                        verbose=True,
+                        verbose=verbose,
                         max_iterations=5
                     )
                     logger.info("ReAct agent initialized with Tavily tools")
@@ -72,7 +123,7 @@ class LlamaIndexService:
                     self.agent = ReActAgent.from_tools(
                         [],
                         llm=self.llm,
-                        verbose=True
+                        verbose=verbose
                     )
                     logger.info("ReAct agent initialized without tools")
             except Exception as e:
@@ -82,7 +133,7 @@ class LlamaIndexService:
                     self.agent = ReActAgent(
                         tools=self.tavily_tools or [],
                         llm=self.llm,
-                        verbose=True,
+                        verbose=verbose,
                         max_iterations=5
                     )
                     logger.info("ReAct agent initialized with alternative method")
@@ -96,32 +147,92 @@ class LlamaIndexService:
             logger.error(f"Failed to initialize LlamaIndex components: {e}")
             raise
     
+    def _cache_tool(self, tool):
+        """Wrap a tool so identical calls within the TTL skip the HTTP round trip."""
+        from llama_index.core.tools import FunctionTool
+
+        inner = tool.fn
+        cache: Dict[str, Tuple[float, Any]] = {}
+
+        def cached(*args, **kwargs):
+            key = repr((args, sorted(kwargs.items())))
+            now = time.monotonic()
+            hit = cache.get(key)
+            if hit is not None and now - hit[0] < self._TOOL_CACHE_TTL:
+                return hit[1]
+            result = inner(*args, **kwargs)
+            if len(cache) >= self._TOOL_CACHE_MAX:
+                cache.clear()
+            cache[key] = (now, result)
+            return result
+
+        return FunctionTool.from_defaults(
+            fn=cached,
+            name=tool.metadata.name,
+            description=tool.metadata.description,
+            fn_schema=tool.metadata.fn_schema,
+        )
+
     def _format_conversation_history(self, messages: List[Dict[str, str]]) -> List:
-        """Convert conversation history to LlamaIndex ChatMessage format."""
+        """Convert conversation history to LlamaIndex ChatMessage format.
+
+        Reuses the ChatMessage objects built on the previous turn when the
+        history only grew at the tail, which is the normal chat pattern.
+        """
         from llama_index.core.llms import ChatMessage, MessageRole
-        
-        chat_messages = []
-        
+
+        role_map = self._role_map
+        if role_map is None:
+            role_map = self._role_map = {
+                "user": MessageRole.USER,
+                "assistant": MessageRole.ASSISTANT,
+                "system": MessageRole.SYSTEM
+            }
+        default_role = role_map["assistant"]
+
         # Take the last N messages based on buffer size
         recent_messages = messages[-self.memory_buffer_size:] if len(messages) > self.memory_buffer_size else messages
-        
-        for msg in recent_messages:
-            role = MessageRole.USER if msg["role"] == "user" else MessageRole.ASSISTANT
-            if msg["role"] == "system":
-                role = MessageRole.SYSTEM
-            
-            chat_messages.append(ChatMessage(
-                role=role,
-                content=msg["content"]
-            ))
-        
+
+        cached_raw, cached_built = self._hist_cache
+        prefix_len = len(cached_raw)
+        if 0 < prefix_len <= len(recent_messages) and recent_messages[:prefix_len] == cached_raw:
+            chat_messages = cached_built + [
+                ChatMessage(role=role_map.get(msg["role"], default_role), content=msg["content"])
+                for msg in recent_messages[prefix_len:]
+            ]
+        else:
+            chat_messages = [
+                ChatMessage(role=role_map.get(msg["role"], default_role), content=msg["content"])
+                for msg in recent_messages
+            ]
+
+        self._hist_cache = (list(recent_messages), chat_messages)
         return chat_messages
     
-    def _ensure_initialized(self):
-        """Ensure components are initialized before use."""
-        if not self._initialized:
+    def discard_memory(self, conversation_id: int):
+        """Drop the cached memory buffer for a conversation.
+
+        Called whenever the stored history changes outside the agent path
+        (direct/streamed turns, regeneration, message deletion), so the
+        next auto turn rebuilds from the database instead of replaying a
+        buffer that has drifted from it.
+        """
+        self._memories.pop(conversation_id, None)
+
+    async def _ensure_initialized(self):
+        """Ensure components are initialized before use.
+
+        Double-checked under a lock: concurrent first requests would
+        otherwise each construct an Ollama client and ReAct agent, and could
+        leave self.llm/self.agent torn between two initializations.
+        """
+        if self._initialized:
+            return
+        async with self._init_lock:
+            if self._initialized:
+                return
             try:
-                self._initialize_components()
+                await asyncio.to_thread(self._initialize_components)
                 self._initialized = True
             except Exception as e:
                 logger.error(f"Failed to initialize LlamaIndex components: {e}")
@@ -131,50 +242,66 @@ class LlamaIndexService:
         self,
         prompt: str,
         conversation_history: List[Dict[str, str]] = None,
-        model: Optional[str] = None
+        model: Optional[str] = None,
+        conversation_id: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         Generate response using auto mode where agent decides whether to use tools.
-        
+
         Args:
             prompt: User's message
             conversation_history: Previous conversation messages
             model: Model to use (optional)
-            
+            conversation_id: When given, the memory buffer is kept and reused
+                across turns of this conversation
+
         Returns:
             Dict containing response, tool usage info, and reasoning
         """
         try:
             # Ensure components are initialized
-            self._ensure_initialized()
+            await self._ensure_initialized()
             # Update model if specified and valid
-            if model and model != self.default_model and model not in ["auto", "internet"]:
+            if model and model != self.default_model and model not in self._RESERVED_MODELS:
                 self.llm.model = model
-            
-            # Format conversation history
-            chat_history = []
-            if conversation_history:
-                chat_history = self._format_conversation_history(conversation_history)
-            
-            # Create memory buffer with conversation history
-            from llama_index.core.memory import ChatMemoryBuffer
-            memory = ChatMemoryBuffer.from_defaults(
-                chat_history=chat_history,
-                llm=self.llm
-            )
-            
+
+            # Reuse the conversation's memory buffer when we have one — the
+            # agent itself appends each turn, so rebuilding it from the full
+            # history window every call is redundant
+            memory = None
+            if conversation_id is not None:
+                memory = self._memories.get(conversation_id)
+                if memory is not None:
+                    self._memories.move_to_end(conversation_id)
+
+            if memory is None:
+                # Format conversation history
+                chat_history = []
+                if conversation_history:
+                    chat_history = self._format_conversation_history(conversation_history)
+
+                # Create memory buffer with conversation history
+                from llama_index.core.memory import ChatMemoryBuffer
+                memory = ChatMemoryBuffer.from_defaults(
+                    chat_history=chat_history,
+                    llm=self.llm
+                )
+                if conversation_id is not None:
+                    self._memories[conversation_id] = memory
+                    while len(self._memories) > self._memories_max:
+                        self._memories.popitem(last=False)
+
             # Check if agent is available
             if self.agent is None:
                 logger.warning("ReAct agent not available, using fallback response")
                 return await self._fallback_response(prompt, conversation_history, model)
-            
+
             # Update agent's memory
             self.agent.memory = memory
             
-            # Generate response using the agent
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, self.agent.chat, prompt
-            )
+            # Generate response using the agent; the sync SDK call runs in
+            # the default thread pool
+            response = await asyncio.to_thread(self.agent.chat, prompt)
             
             # Extract information about tool usage
             tool_calls = []
@@ -190,8 +317,9 @@ class LlamaIndexService:
             if hasattr(self.agent, 'memory') and hasattr(self.agent.memory, 'get_all'):
                 recent_messages = self.agent.memory.get_all()
                 for msg in recent_messages[-3:]:  # Get last few messages for reasoning
-                    if "Thought:" in str(msg.content) or "Action:" in str(msg.content):
-                        reasoning_steps.append(str(msg.content))
+                    content = msg.content if isinstance(msg.content, str) else str(msg.content)
+                    if self._REASONING_RE.search(content):
+                        reasoning_steps.append(content)
             
             return {
                 "content": str(response),
@@ -227,7 +355,7 @@ class LlamaIndexService:
             from app.services.ollama_service import ollama_service
             
             # Use the direct Ollama service which uses /api/generate endpoint
-            model_name = model if model and model not in ["auto", "internet"] else self.default_model
+            model_name = model if model and model not in self._RESERVED_MODELS else self.default_model
             
             logger.info(f"Using fallback Ollama service with model: {model_name}")
             
@@ -256,32 +384,23 @@ class LlamaIndexService:
             logger.error(f"Fallback response generation failed: {e}")
             raise Exception(f"Failed to generate response: {e}")
     
-    async def check_search_intent(self, prompt: str) -> bool:
+    def check_search_intent(self, prompt: str) -> bool:
         """
         Analyze if the prompt requires internet search.
         This is a simple heuristic - the ReAct agent will make the final decision.
         """
-        search_indicators = [
-            "current", "today", "now", "latest", "recent", "news",
-            "weather", "stock", "price", "what's happening",
-            "update", "2024", "2025", "this year", "this month"
-        ]
-        
-        prompt_lower = prompt.lower()
-        return any(indicator in prompt_lower for indicator in search_indicators)
+        return self._SEARCH_INTENT_RE.search(prompt) is not None
     
     async def health_check(self) -> bool:
         """Check if LlamaIndex service is healthy."""
         try:
             # Ensure components are initialized
-            self._ensure_initialized()
-            
+            await self._ensure_initialized()
+
             # Test basic LLM functionality
             from llama_index.core.llms import ChatMessage, MessageRole
             test_message = ChatMessage(role=MessageRole.USER, content="Hello")
-            response = await asyncio.get_event_loop().run_in_executor(
-                None, self.llm.chat, [test_message]
-            )
+            response = await asyncio.to_thread(self.llm.chat, [test_message])
             return bool(response and response.message.content)
         except Exception as e:
             logger.error(f"LlamaIndex health check failed: {e}")
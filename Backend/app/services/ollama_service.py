@@ -1,30 +1,162 @@
 import httpx
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from typing import AsyncGenerator, List, Dict, Any, Optional, Tuple
 from app.config import settings
+from app.services.http_client import shared_client, post_with_retries, CircuitBreaker
+import asyncio
+import hashlib
 import logging
+import math
+import orjson
+import time
 
 logger = logging.getLogger(__name__)
 
+# Generation budget, staged: connection problems surface in seconds while
+# the read stage keeps room for long completions
+GENERATE_TIMEOUT = httpx.Timeout(connect=3.0, read=120.0, write=10.0, pool=5.0)
+
 
 class OllamaService:
-    def __init__(self):
+    # Response cache: identical (model, system, history, prompt) requests
+    # within the TTL skip the Ollama round trip entirely. Sampling is not
+    # deterministic (Ollama's default temperature is 0.8), so this trades
+    # answer variety for latency on repeat traffic — callers that exist to
+    # produce a different answer (regenerate) pass bypass_cache=True.
+    _CACHE_TTL = 300.0
+    _CACHE_MAX = 1024
+
+    # Semantic cache (opt-in via settings.semantic_cache_enabled): prompts
+    # whose embeddings are this close reuse a prior response, so one cheap
+    # embedding call replaces a multi-second generation for paraphrases.
+    # History-carrying requests bypass it entirely — the match criteria
+    # don't include conversation history.
+    _SEM_THRESHOLD = 0.92
+    _SEM_CACHE_MAX = 256
+    _EMBED_MODEL = "nomic-embed-text"
+
+    # How long a fetched model list answers existence checks before the
+    # tags endpoint is consulted again
+    _MODELS_TTL = 60.0
+
+    # Keep model weights resident between turns so a pause in the
+    # conversation doesn't pay the multi-second reload
+    _KEEP_ALIVE = "1h"
+
+    # Smoothing factor for the per-model tokens/sec EWMA; 0.1 weights
+    # roughly the last ten generations
+    _TOKRATE_ALPHA = 0.1
+
+    def __init__(self, client: httpx.AsyncClient = None):
         self.base_url = settings.ollama_base_url
         self.default_model = settings.ollama_default_model
-        self.client = httpx.AsyncClient(
-            timeout=httpx.Timeout(120.0),
-            limits=httpx.Limits(max_keepalive_connections=10)
+        # Shared pooled client unless an explicit one is injected
+        self.client = client if client is not None else shared_client
+        # Endpoint URLs built once; keeps f-string assembly off the hot path
+        self._url_chat = f"{self.base_url}/api/chat"
+        self._url_generate = f"{self.base_url}/api/generate"
+        self._url_tags = f"{self.base_url}/api/tags"
+        self._url_pull = f"{self.base_url}/api/pull"
+        self._url_embeddings = f"{self.base_url}/api/embeddings"
+        # key -> (monotonic insert time, response dict); ordered for LRU
+        # eviction. Only touched synchronously on the event loop, so no
+        # lock is needed.
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Ring buffer of (normalized embedding, model, system message,
+        # response dict); _sem_next is the next overwrite slot
+        self._sem_entries: List[Tuple[List[float], str, Optional[str], Dict[str, Any]]] = []
+        self._sem_next = 0
+        # Models seen in /api/tags or used successfully; saves a tags
+        # round trip on every generation
+        self._known_models: set = set()
+        self._models_fetched_at = 0.0
+        # Identical requests currently in flight; followers await the
+        # leader's future instead of issuing their own call
+        self._inflight: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+        # Fail fast while Ollama is down instead of letting every request
+        # wait out the 120 s timeout
+        self._breaker = CircuitBreaker("Ollama")
+        # Smoothed generation throughput per model (tokens/sec), fed by
+        # the eval stats Ollama returns with every response
+        self._tokrate: Dict[str, float] = {}
+
+    @staticmethod
+    def _cache_key(model_name: str, system_message: Optional[str], messages: List[Dict[str, str]]) -> str:
+        """Digest of everything that determines the response."""
+        payload = orjson.dumps(
+            {"m": model_name, "s": system_message, "h": messages},
+            option=orjson.OPT_SORT_KEYS
         )
+        return hashlib.sha256(payload).hexdigest()
 
-    async def close(self):
-        """Close the HTTP client."""
-        await self.client.aclose()
+    async def _embed(self, prompt: str) -> Optional[List[float]]:
+        """Fetch a normalized embedding for the prompt, or None on failure."""
+        try:
+            response = await self.client.post(
+                self._url_embeddings,
+                content=orjson.dumps({"model": self._EMBED_MODEL, "prompt": prompt}),
+                headers={"content-type": "application/json"},
+                timeout=10.0
+            )
+            response.raise_for_status()
+            vector = orjson.loads(response.content).get("embedding")
+            if not vector:
+                return None
+            norm = math.sqrt(sum(v * v for v in vector))
+            if norm == 0.0:
+                return None
+            return [v / norm for v in vector]
+        except Exception as e:
+            logger.debug(f"Embedding call failed, skipping semantic cache: {e}")
+            return None
+
+    def _semantic_lookup(
+        self,
+        vector: List[float],
+        model_name: str,
+        system_message: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Return the best cached response above the similarity threshold."""
+        best = None
+        best_sim = self._SEM_THRESHOLD
+        for entry_vec, entry_model, entry_system, entry_result in self._sem_entries:
+            if entry_model != model_name or entry_system != system_message:
+                continue
+            sim = sum(a * b for a, b in zip(vector, entry_vec))
+            if sim > best_sim:
+                best_sim = sim
+                best = entry_result
+        return best
+
+    def _semantic_store(
+        self,
+        vector: List[float],
+        model_name: str,
+        system_message: Optional[str],
+        result: Dict[str, Any]
+    ):
+        entry = (vector, model_name, system_message, result)
+        # Overwrite an entry the new vector would already match, so a
+        # refreshed answer replaces the stale one instead of losing
+        # lookups to it
+        for i, (entry_vec, entry_model, entry_system, _) in enumerate(self._sem_entries):
+            if entry_model != model_name or entry_system != system_message:
+                continue
+            if sum(a * b for a, b in zip(vector, entry_vec)) > self._SEM_THRESHOLD:
+                self._sem_entries[i] = entry
+                return
+        if len(self._sem_entries) < self._SEM_CACHE_MAX:
+            self._sem_entries.append(entry)
+        else:
+            self._sem_entries[self._sem_next] = entry
+            self._sem_next = (self._sem_next + 1) % self._SEM_CACHE_MAX
 
     async def list_models(self) -> List[Dict[str, Any]]:
         """List all available models in Ollama."""
         try:
-            response = await self.client.get(f"{self.base_url}/api/tags")
+            response = await self.client.get(self._url_tags)
             response.raise_for_status()
-            data = response.json()
+            data = orjson.loads(response.content)
             return data.get("models", [])
         except httpx.RequestError as e:
             logger.error(f"Error connecting to Ollama: {e}")
@@ -37,7 +169,7 @@ class OllamaService:
         """Pull a model to Ollama."""
         try:
             response = await self.client.post(
-                f"{self.base_url}/api/pull",
+                self._url_pull,
                 json={"name": model_name}
             )
             response.raise_for_status()
@@ -50,37 +182,89 @@ class OllamaService:
             return False
 
     async def check_model_exists(self, model_name: str) -> bool:
-        """Check if a model exists in Ollama."""
+        """Check if a model exists in Ollama.
+
+        A model seen once (in the tags listing or via a successful
+        generation) is trusted from then on; otherwise the tags listing is
+        refetched at most once per TTL. Keeps the per-generation existence
+        check off the network.
+        """
+        if model_name in self._known_models:
+            return True
         try:
-            models = await self.list_models()
-            model_names = [model["name"] for model in models]
-            return model_name in model_names
+            if time.monotonic() - self._models_fetched_at > self._MODELS_TTL:
+                models = await self.list_models()
+                self._known_models.update(model["name"] for model in models)
+                self._models_fetched_at = time.monotonic()
+            return model_name in self._known_models
         except Exception as e:
             logger.warning(f"Could not check if model exists: {e}")
             return False
 
+    # Opening turns pinned at the front of the history window. A pure
+    # sliding window shifts the whole prompt every turn, so the server-side
+    # prompt cache never gets a prefix hit; keeping system + the first
+    # exchange byte-stable means only the tail of the prompt changes.
+    _HISTORY_FIXED = 2
+
     def format_conversation_history(self, messages: List[Dict[str, str]], max_messages: int = 10) -> List[Dict[str, str]]:
-        """Format conversation history for Ollama, keeping last N messages."""
-        # Take the last max_messages messages
-        recent_messages = messages[-max_messages:] if len(messages) > max_messages else messages
-        
-        formatted_messages = []
-        for msg in recent_messages:
-            formatted_messages.append({
-                "role": msg["role"],
-                "content": msg["content"]
-            })
-        
-        return formatted_messages
+        """Format conversation history for Ollama with a stable prefix.
+
+        Keeps the first _HISTORY_FIXED messages plus a rolling tail rather
+        than a plain last-N window, so long conversations retain their
+        opening context and the prompt prefix stays cache-friendly.
+        """
+        if len(messages) > max_messages:
+            recent_messages = (
+                messages[:self._HISTORY_FIXED]
+                + messages[-(max_messages - self._HISTORY_FIXED):]
+            )
+        else:
+            recent_messages = messages
+
+        # Callers already pass minimal {role, content} dicts; rebuilding
+        # each one would just churn allocations on every turn
+        if all(msg.keys() == {"role", "content"} for msg in recent_messages):
+            return list(recent_messages)
+
+        return [
+            {"role": msg["role"], "content": msg["content"]}
+            for msg in recent_messages
+        ]
+
+    def _build_messages(
+        self,
+        prompt: str,
+        conversation_history: List[Dict[str, str]] = None,
+        system_message: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """Assemble the /api/chat messages array.
+
+        System message first (a byte-identical static prefix keeps Ollama's
+        prompt cache warm), then the history window, then the new user turn.
+        """
+        messages = []
+        if system_message:
+            messages.append({"role": "system", "content": system_message})
+        if conversation_history:
+            messages.extend(self.format_conversation_history(conversation_history))
+        messages.append({"role": "user", "content": prompt})
+        return messages
 
     async def generate_response(
         self,
         prompt: str,
         conversation_history: List[Dict[str, str]] = None,
         model: Optional[str] = None,
-        system_message: Optional[str] = None
+        system_message: Optional[str] = None,
+        bypass_cache: bool = False
     ) -> Dict[str, Any]:
-        """Generate a response from Ollama."""
+        """Generate a response from Ollama.
+
+        bypass_cache skips the exact and semantic cache lookups (the stored
+        entry is still refreshed with the new result) for callers that need
+        a fresh sample of an already-answered prompt, like regenerate.
+        """
         if model == 'auto':
             model_name = self.default_model
         else:
@@ -95,36 +279,109 @@ class OllamaService:
         except Exception as e:
             logger.warning(f"Model check failed: {e}. Proceeding anyway...")
 
-        # Prepare messages
-        messages = []
-        
-        # Add system message if provided
-        if system_message:
-            messages.append({"role": "system", "content": system_message})
-        
-        # Add conversation history
-        if conversation_history:
-            formatted_history = self.format_conversation_history(conversation_history)
-            messages.extend(formatted_history)
-        
-        # Add current user message
-        messages.append({"role": "user", "content": prompt})
+        messages = self._build_messages(prompt, conversation_history, system_message)
+
+        cache_key = self._cache_key(model_name, system_message, messages)
+        if not bypass_cache:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                if time.monotonic() - cached[0] < self._CACHE_TTL:
+                    self._cache.move_to_end(cache_key)
+                    return {**cached[1], "cached": True}
+                del self._cache[cache_key]
 
+        # Near-duplicate prompts (paraphrases) can reuse a prior answer:
+        # one embedding call against the best stored match, instead of a
+        # full generation. Only history-free prompts qualify: the match is
+        # on (model, system, prompt embedding) alone, and history-dependent
+        # prompts ("summarize the above") embed nearly identically across
+        # conversations while meaning entirely different things.
+        prompt_vector = None
+        if settings.semantic_cache_enabled and not conversation_history:
+            prompt_vector = await self._embed(prompt)
+            if prompt_vector is not None and not bypass_cache:
+                match = self._semantic_lookup(prompt_vector, model_name, system_message)
+                if match is not None:
+                    return {**match, "cached": True}
+
+        if not bypass_cache:
+            # Singleflight: an identical request already in flight is
+            # awaited instead of duplicated, so a burst of the same
+            # question costs one generation
+            inflight = self._inflight.get(cache_key)
+            if inflight is not None:
+                return {**await inflight, "cached": True}
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
         try:
-            response = await self.client.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": model_name,
-                    "prompt": prompt,
-                    "stream": False
-                },
-                timeout=120.0
+            result = await self._generate_uncached(model_name, messages)
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieve the exception in case no follower is waiting, so the
+            # loop doesn't warn about it going unretrieved
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(cache_key, None)
+
+        # The generation worked, so the model demonstrably exists;
+        # later existence checks can skip the tags round trip
+        self._known_models.add(model_name)
+        self._record_token_rate(model_name, result)
+        self._cache[cache_key] = (time.monotonic(), result)
+        while len(self._cache) > self._CACHE_MAX:
+            self._cache.popitem(last=False)
+        if prompt_vector is not None:
+            self._semantic_store(prompt_vector, model_name, system_message, result)
+        return result
+
+    def _record_token_rate(self, model_name: str, result: Dict[str, Any]):
+        """Fold this generation's eval stats into the per-model EWMA."""
+        eval_count = result.get("eval_count")
+        eval_duration = result.get("eval_duration")
+        if not eval_count or not eval_duration:
+            return
+        rate = eval_count * 1e9 / eval_duration  # durations are in ns
+        previous = self._tokrate.get(model_name)
+        if previous is None:
+            self._tokrate[model_name] = rate
+        else:
+            self._tokrate[model_name] = (
+                (1 - self._TOKRATE_ALPHA) * previous + self._TOKRATE_ALPHA * rate
             )
-            response.raise_for_status()
-            data = response.json()
-            
+
+    def token_rates(self) -> Dict[str, float]:
+        """Smoothed tokens/sec per model, for monitoring."""
+        return dict(self._tokrate)
+
+    async def _generate_uncached(self, model_name: str, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        """Issue the actual /api/chat request and shape the response."""
+        # Concurrent generations already overlap: each request is an
+        # independent task on the shared pooled client, so Ollama sees them
+        # simultaneously and applies its own server-side batching. Queueing
+        # them here behind a micro-batch window would add wait time without
+        # saving a round trip — Ollama exposes no multi-prompt endpoint.
+        try:
+            async with self._breaker:
+                response = await post_with_retries(
+                    self.client,
+                    self._url_chat,
+                    content=orjson.dumps({
+                        "model": model_name,
+                        "messages": messages,
+                        "stream": False,
+                        "keep_alive": self._KEEP_ALIVE
+                    }),
+                    headers={"content-type": "application/json"},
+                    timeout=GENERATE_TIMEOUT
+                )
+                response.raise_for_status()
+            data = orjson.loads(response.content)
+
             return {
-                "content": data.get("response", ""),
+                "content": data.get("message", {}).get("content", ""),
                 "model": model_name,
                 "total_duration": data.get("total_duration"),
                 "load_duration": data.get("load_duration"),
@@ -133,7 +390,7 @@ class OllamaService:
                 "eval_count": data.get("eval_count"),
                 "eval_duration": data.get("eval_duration")
             }
-            
+
         except httpx.RequestError as e:
             logger.error(f"Error generating response: {e}")
             error_msg = str(e)
@@ -149,10 +406,84 @@ class OllamaService:
                 error_msg = e.response.text
             raise Exception(f"Ollama API error (Status {e.response.status_code}): {error_msg}")
 
+    async def stream_response(
+        self,
+        prompt: str,
+        conversation_history: List[Dict[str, str]] = None,
+        model: Optional[str] = None,
+        system_message: Optional[str] = None
+    ) -> AsyncGenerator[str, None]:
+        """Stream a response from Ollama, yielding text chunks as they arrive."""
+        if not model or model in ("auto", "internet"):
+            model_name = self.default_model
+        else:
+            model_name = model
+
+        messages = self._build_messages(prompt, conversation_history, system_message)
+
+        try:
+            async with self._breaker, self.client.stream(
+                "POST",
+                self._url_chat,
+                content=orjson.dumps({
+                    "model": model_name,
+                    "messages": messages,
+                    "stream": True,
+                    "keep_alive": self._KEEP_ALIVE
+                }),
+                headers={"content-type": "application/json"},
+                timeout=GENERATE_TIMEOUT
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    data = orjson.loads(line)
+                    chunk = data.get("message", {}).get("content", "")
+                    if chunk:
+                        yield chunk
+                    if data.get("done"):
+                        break
+
+        except httpx.RequestError as e:
+            logger.error(f"Error streaming response: {e}")
+            error_msg = str(e)
+            if "Connection refused" in error_msg or "Connect" in error_msg:
+                raise Exception(f"Cannot connect to Ollama at {self.base_url}. Make sure Ollama is running.")
+            raise Exception(f"Failed to stream response: {error_msg}")
+        except httpx.HTTPStatusError as e:
+            logger.error(f"Ollama API error: {e.response.status_code}")
+            raise Exception(f"Ollama API error (Status {e.response.status_code})")
+
+    async def warmup(self):
+        """Load the default model's weights so the first user message
+        doesn't pay the cold-start load_duration.
+
+        An empty-prompt generate is Ollama's documented way to trigger a
+        load; keep_alive holds the weights resident afterwards. Failure is
+        logged, not raised — a cold Ollama just means the first real
+        request loads the model instead.
+        """
+        try:
+            response = await self.client.post(
+                self._url_generate,
+                json={
+                    "model": self.default_model,
+                    "prompt": "",
+                    "keep_alive": self._KEEP_ALIVE
+                },
+                timeout=GENERATE_TIMEOUT
+            )
+            response.raise_for_status()
+            self._known_models.add(self.default_model)
+            logger.info(f"Warmed up model {self.default_model}")
+        except Exception as e:
+            logger.warning(f"Model warmup failed (will load on first request): {e}")
+
     async def health_check(self) -> bool:
         """Check if Ollama is healthy."""
         try:
-            response = await self.client.get(f"{self.base_url}/api/tags")
+            response = await self.client.get(self._url_tags)
             return response.status_code == 200
         except:
             return False
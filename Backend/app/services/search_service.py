@@ -1,23 +1,56 @@
 import httpx
-from typing import List, Dict, Any, Optional
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 from app.config import settings
+from app.services.http_client import shared_client, post_with_retries, CircuitBreaker
+import asyncio
+import hashlib
 import logging
+import orjson
+import time
+from itertools import islice
 
 logger = logging.getLogger(__name__)
 
+# Search calls are short; don't inherit the shared client's long default.
+# Staged so a dead peer fails at connect in seconds rather than spending
+# the whole read budget.
+SEARCH_TIMEOUT = httpx.Timeout(connect=3.0, read=30.0, write=5.0, pool=2.0)
+
 
 class SearchService:
-    def __init__(self):
+    # Every Tavily call costs money and 0.7-2 s of latency; identical
+    # queries within the TTL are answered from memory instead
+    _CACHE_MAX = 512
+
+    def __init__(self, client: httpx.AsyncClient = None):
         self.api_key = settings.tavily_api_key
         self.base_url = "https://api.tavily.com"
-        self.client = httpx.AsyncClient(
-            timeout=httpx.Timeout(30.0),
-            limits=httpx.Limits(max_keepalive_connections=5)
-        )
+        # Shared pooled client unless an explicit one is injected
+        self.client = client if client is not None else shared_client
+        # Endpoint URL built once; keeps f-string assembly off the hot path
+        self._url_search = f"{self.base_url}/search"
+        # key -> (monotonic insert time, result dict); ordered for LRU
+        # eviction, touched only synchronously on the event loop
+        self._cache: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        # Identical searches currently in flight; followers await the
+        # leader's future instead of paying for their own API call
+        self._inflight: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+        # Fail fast during a Tavily outage instead of stacking up timeouts
+        self._breaker = CircuitBreaker("Tavily search")
 
-    async def close(self):
-        """Close the HTTP client."""
-        await self.client.aclose()
+    @staticmethod
+    def _cache_key(
+        query: str,
+        max_results: int,
+        search_depth: str,
+        include_domains: Optional[List[str]],
+        exclude_domains: Optional[List[str]]
+    ) -> str:
+        payload = orjson.dumps(
+            [query, max_results, search_depth, include_domains or [], exclude_domains or []]
+        )
+        return hashlib.blake2b(payload, digest_size=16).hexdigest()
 
     async def search(
         self,
@@ -40,6 +73,14 @@ class SearchService:
         if not self.api_key:
             raise Exception("Tavily API key not configured")
 
+        cache_key = self._cache_key(query, max_results, search_depth, include_domains, exclude_domains)
+        cached = self._cache.get(cache_key)
+        if cached is not None:
+            if time.monotonic() - cached[0] < settings.search_cache_ttl:
+                self._cache.move_to_end(cache_key)
+                return cached[1]
+            del self._cache[cache_key]
+
         payload = {
             "api_key": self.api_key,
             "query": query,
@@ -55,14 +96,51 @@ class SearchService:
         if exclude_domains:
             payload["exclude_domains"] = exclude_domains
 
+        # Singleflight: an identical search already in flight is awaited
+        # instead of duplicated
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None:
+            return await inflight
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
         try:
-            response = await self.client.post(
-                f"{self.base_url}/search",
-                json=payload
-            )
-            response.raise_for_status()
-            data = response.json()
-            
+            result = await self._search_uncached(payload, query, max_results, search_depth)
+            future.set_result(result)
+        except BaseException as e:
+            future.set_exception(e)
+            # Retrieve the exception in case no follower is waiting, so the
+            # loop doesn't warn about it going unretrieved
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(cache_key, None)
+
+        self._cache[cache_key] = (time.monotonic(), result)
+        while len(self._cache) > self._CACHE_MAX:
+            self._cache.popitem(last=False)
+        return result
+
+    async def _search_uncached(
+        self,
+        payload: Dict[str, Any],
+        query: str,
+        max_results: int,
+        search_depth: str
+    ) -> Dict[str, Any]:
+        """Issue the actual Tavily request and shape the response."""
+        try:
+            async with self._breaker:
+                response = await post_with_retries(
+                    self.client,
+                    self._url_search,
+                    content=orjson.dumps(payload),
+                    headers={"content-type": "application/json"},
+                    timeout=SEARCH_TIMEOUT
+                )
+                response.raise_for_status()
+            data = orjson.loads(response.content)
+
             return {
                 "query": query,
                 "answer": data.get("answer", ""),
@@ -73,7 +151,7 @@ class SearchService:
                     "max_results": max_results
                 }
             }
-            
+
         except httpx.RequestError as e:
             logger.error(f"Error connecting to Tavily API: {e}")
             raise Exception(f"Failed to connect to Tavily API: {e}")
@@ -86,52 +164,51 @@ class SearchService:
             else:
                 raise Exception(f"Tavily API error: {e}")
 
+    # Prompt-formatting bounds: results included and characters of content
+    # per result. Content is cut at a word boundary so the prompt doesn't
+    # spend context on a dangling half-word.
+    _RESULT_LIMIT = 5
+    _CONTENT_CHARS = 300
+
     def format_search_results_for_llm(self, search_data: Dict[str, Any]) -> str:
         """Format search results for inclusion in LLM prompt."""
         if not search_data.get("results"):
             return "No search results found."
 
-        formatted_results = []
-        
+        parts = []
+
         # Add the direct answer if available
         if search_data.get("answer"):
-            formatted_results.append(f"Direct Answer: {search_data['answer']}\n")
+            parts.append(f"Direct Answer: {search_data['answer']}\n")
 
-        # Add individual search results
-        formatted_results.append("Search Results:")
-        for i, result in enumerate(search_data["results"][:5], 1):  # Limit to top 5 results
-            title = result.get("title", "No title")
-            url = result.get("url", "")
+        # Add individual search results; one formatted block per result
+        # keeps this a single join instead of three appends each
+        parts.append("Search Results:")
+        for i, result in enumerate(islice(search_data["results"], self._RESULT_LIMIT), 1):
             content = result.get("content", "No content available")
-            
-            # Truncate content if too long
-            if len(content) > 300:
-                content = content[:300] + "..."
-            
-            formatted_results.append(f"\n{i}. {title}")
-            formatted_results.append(f"   URL: {url}")
-            formatted_results.append(f"   Content: {content}")
+            if len(content) > self._CONTENT_CHARS:
+                cut = content.rfind(" ", 0, self._CONTENT_CHARS)
+                content = content[:cut if cut > 0 else self._CONTENT_CHARS] + "..."
+
+            parts.append(
+                f"\n{i}. {result.get('title', 'No title')}\n"
+                f"   URL: {result.get('url', '')}\n"
+                f"   Content: {content}"
+            )
 
-        return "\n".join(formatted_results)
+        return "\n".join(parts)
 
     async def health_check(self) -> bool:
-        """Check if Tavily API is accessible."""
+        """Check if Tavily search is usable without issuing a billable query.
+
+        Every Tavily call is paid, so a probe that runs a real search
+        charges for each liveness check. Healthy means an API key is
+        configured and real searches haven't been failing consecutively —
+        the circuit breaker already tracks exactly that.
+        """
         if not self.api_key:
             return False
-            
-        try:
-            # Simple test search
-            response = await self.client.post(
-                f"{self.base_url}/search",
-                json={
-                    "api_key": self.api_key,
-                    "query": "test",
-                    "max_results": 1
-                }
-            )
-            return response.status_code == 200
-        except:
-            return False
+        return not self._breaker.is_open
 
 
 # Global instance